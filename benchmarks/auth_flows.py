@@ -0,0 +1,385 @@
+"""
+Throughput and latency of the auth flows: register, login, refresh, an
+authenticated GET, revoke and logout.
+
+In-process, through the Flask test client, for microbenchmarks:
+
+    python -m benchmarks.auth_flows run --output base.json
+
+End to end, against gunicorn started locally on sqlite or on the database
+given with --database-uri, with concurrent clients:
+
+    python -m benchmarks.auth_flows run --gunicorn --workers 4 \\
+        --concurrency 8 --output base.json
+
+Then, after a change, flag the flows that got slower than the threshold:
+
+    python -m benchmarks.auth_flows compare base.json new.json
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+
+from jam.extensions import db
+
+from .common import gunicorn_server, make_app, request, summarize
+
+FLOWS = ("register", "login", "refresh", "get", "revoke", "logout")
+
+# Flows whose throughput went down, or whose mean/p99 latency went up, by
+# more than this fraction are reported as regressions.
+DEFAULT_THRESHOLD = 0.1
+
+
+class TestClient(object):
+    """
+    Sends requests to an app in this process.
+    """
+
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def __call__(self, method, path, json_body=None, token=None):
+        headers = {}
+        if token:
+            headers["Authorization"] = "Bearer " + token
+        response = self.client.open(
+            path, method=method, json=json_body, headers=headers
+        )
+        return response.status_code, response.get_json(silent=True)
+
+
+class HTTPClient(object):
+    """
+    Sends requests to a running server.
+    """
+
+    def __init__(self, url):
+        self.url = url
+
+    def __call__(self, method, path, json_body=None, token=None):
+        return request(self.url + path, method, json_body, token)
+
+
+def check(expected, result):
+    status, body = result
+    if status != expected:
+        raise RuntimeError(
+            "Expected {}, got {} {}".format(expected, status, body)
+        )
+    return body
+
+
+def login(call, username):
+    return check(
+        200,
+        call(
+            "POST",
+            "/api/auth/token",
+            {"username": username, "password": "bench"},
+        ),
+    )
+
+
+def prepare(call, number):
+    """
+    Registers the benchmark user and returns, for every flow, a function
+    running it once. Tokens the flows use up are issued beforehand.
+    """
+    username = "bench-" + uuid.uuid4().hex[:8]
+    check(
+        201,
+        call(
+            "POST",
+            "/api/auth/register",
+            {"username": username, "password": "bench"},
+        ),
+    )
+    tokens = login(call, username)
+    # The revoke flow toggles a token the other flows don't use.
+    login(call, username)
+    listed = check(
+        200, call("GET", "/api/auth/token", token=tokens["access_token"])
+    )
+    spare_id = listed[-1]["token_id"]
+    to_logout = [
+        login(call, username)["access_token"] for _ in range(number)
+    ]
+    lock = threading.Lock()
+    revoke_state = [False]
+
+    def register():
+        check(
+            201,
+            call(
+                "POST",
+                "/api/auth/register",
+                {
+                    "username": "bench-" + uuid.uuid4().hex,
+                    "password": "bench",
+                },
+            ),
+        )
+
+    def refresh():
+        check(
+            200,
+            call("POST", "/api/auth/refresh", token=tokens["refresh_token"]),
+        )
+
+    def get():
+        check(
+            200,
+            call(
+                "GET",
+                "/api/auth/token?limit=10",
+                token=tokens["access_token"],
+            ),
+        )
+
+    def revoke():
+        with lock:
+            revoke_state[0] = not revoke_state[0]
+            revoked = revoke_state[0]
+        check(
+            200,
+            call(
+                "PUT",
+                "/api/auth/token/{}".format(spare_id),
+                {"revoke": revoked},
+                token=tokens["access_token"],
+            ),
+        )
+
+    def logout():
+        with lock:
+            token = to_logout.pop()
+        check(200, call("POST", "/api/auth/logout/access", token=token))
+
+    return {
+        "register": register,
+        "login": lambda: login(call, username),
+        "refresh": refresh,
+        "get": get,
+        "revoke": revoke,
+        "logout": logout,
+    }
+
+
+def load(fn, number, concurrency):
+    """
+    Calls fn number times from concurrency threads. Returns the duration of
+    every call and the wall clock time of the whole run.
+    """
+    samples = []
+    counter = iter(range(number))
+    lock = threading.Lock()
+
+    def worker():
+        while True:
+            with lock:
+                if next(counter, None) is None:
+                    return
+            start = time.perf_counter()
+            fn()
+            elapsed = time.perf_counter() - start
+            with lock:
+                samples.append(elapsed)
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return samples, time.perf_counter() - start
+
+
+def run_flows(call, flows, number, concurrency):
+    runners = prepare(call, number)
+    results = {}
+    for flow in flows:
+        samples, wall = load(runners[flow], number, concurrency)
+        summary = summarize(samples)
+        summary["ops_per_sec"] = len(samples) / wall
+        results[flow] = summary
+        print(
+            "{:<10} n={n:<6} mean={mean_us:>10.1f}us p50={p50_us:>10.1f}us "
+            "p99={p99_us:>10.1f}us {ops_per_sec:>10.1f} ops/s".format(
+                flow, **summary
+            ),
+            file=sys.stderr,
+        )
+    return results
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"],
+            stderr=subprocess.DEVNULL,
+            universal_newlines=True,
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(args):
+    path = None
+    uri = args.database_uri
+    if uri is None:
+        fd, path = tempfile.mkstemp(suffix=".db")
+        os.close(fd)
+        uri = "sqlite:///" + path
+
+    config = {
+        "PASSWORD_HASH_METHOD": args.hash_method,
+        # Every login comes from the same user and client.
+        "LOGIN_THROTTLE_BACKEND": "",
+    }
+    try:
+        if args.gunicorn:
+            env = dict(config, JAM_CONFIG="production", DATABASE_URI=uri)
+            with gunicorn_server(
+                env, workers=args.workers, worker_class=args.worker_class
+            ) as url:
+                results = run_flows(
+                    HTTPClient(url), args.flows, args.number, args.concurrency
+                )
+        else:
+            app = make_app(
+                uri, JWT_ON=True, JWT_BLACKLIST_ENABLED=True, **config
+            )
+            with app.app_context():
+                db.create_all()
+                results = run_flows(
+                    TestClient(app), args.flows, args.number, args.concurrency
+                )
+    finally:
+        if path is not None:
+            os.remove(path)
+
+    report = {
+        "meta": {
+            "mode": "gunicorn" if args.gunicorn else "in-process",
+            "database": uri.split(":", 1)[0],
+            "number": args.number,
+            "concurrency": args.concurrency,
+            "workers": args.workers if args.gunicorn else None,
+            "worker_class": args.worker_class if args.gunicorn else None,
+            "hash_method": args.hash_method,
+            "revision": git_revision(),
+            "python": platform.python_version(),
+            "time": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        },
+        "results": results,
+    }
+    data = json.dumps(report, indent=2, sort_keys=True) + "\n"
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(data)
+    else:
+        sys.stdout.write(data)
+
+
+def compare(args):
+    """
+    Prints the change of every flow between two runs, and returns 1 when a
+    flow regressed by more than the threshold.
+    """
+    with open(args.base) as f:
+        base = json.load(f)
+    with open(args.new) as f:
+        new = json.load(f)
+    for key in sorted(set(base["meta"]) - {"revision", "time"}):
+        if base["meta"][key] != new["meta"].get(key):
+            print(
+                "warning: {} differs, {} vs {}".format(
+                    key, base["meta"][key], new["meta"].get(key)
+                )
+            )
+
+    regressions = 0
+    for flow in FLOWS:
+        if flow not in base["results"] or flow not in new["results"]:
+            continue
+        before, after = base["results"][flow], new["results"][flow]
+        changes = {
+            key: after[key] / before[key] - 1 if before[key] else 0
+            for key in ("mean_us", "p99_us", "ops_per_sec")
+        }
+        regressed = (
+            changes["mean_us"] > args.threshold
+            or changes["p99_us"] > args.threshold
+            or changes["ops_per_sec"] < -args.threshold
+        )
+        regressions += regressed
+        print(
+            "{:<10} mean {:>+7.1%} p99 {:>+7.1%} ops/s {:>+7.1%} {}".format(
+                flow,
+                changes["mean_us"],
+                changes["p99_us"],
+                changes["ops_per_sec"],
+                "REGRESSION" if regressed else "",
+            ).rstrip()
+        )
+    return 1 if regressions else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawTextHelpFormatter
+    )
+    commands = parser.add_subparsers(dest="command")
+    commands.required = True
+
+    run_parser = commands.add_parser("run", help="Run the benchmarks.")
+    run_parser.add_argument("--number", type=int, default=200)
+    run_parser.add_argument("--concurrency", type=int, default=1)
+    run_parser.add_argument(
+        "--flows",
+        nargs="+",
+        choices=FLOWS,
+        default=list(FLOWS),
+        metavar="FLOW",
+        help="Any of {}.".format(", ".join(FLOWS)),
+    )
+    run_parser.add_argument(
+        "--gunicorn", action="store_true", help="Run against gunicorn."
+    )
+    run_parser.add_argument("--workers", type=int, default=1)
+    run_parser.add_argument("--worker-class", default="gevent")
+    run_parser.add_argument(
+        "--database-uri", help="Defaults to a temporary sqlite file."
+    )
+    run_parser.add_argument(
+        "--hash-method",
+        default="pbkdf2:sha256:150000",
+        help="PASSWORD_HASH_METHOD, lower it to leave hashing out.",
+    )
+    run_parser.add_argument("--output", help="JSON file, default stdout.")
+    run_parser.set_defaults(func=run)
+
+    compare_parser = commands.add_parser(
+        "compare", help="Compare two runs, exit 1 on regressions."
+    )
+    compare_parser.add_argument("base")
+    compare_parser.add_argument("new")
+    compare_parser.add_argument(
+        "--threshold", type=float, default=DEFAULT_THRESHOLD
+    )
+    compare_parser.set_defaults(func=compare)
+
+    args = parser.parse_args()
+    sys.exit(args.func(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+"""
+Helpers shared by the benchmark scripts.
+"""
+import http.client
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+from contextlib import contextmanager
+
+from jam import create_app
+from jam.settings import TestingConfig, conf
+
+
+def make_app(database_uri="sqlite://", **overrides):
+    """
+    Returns an app running the testing config against ``database_uri``,
+    with any extra config given as keyword arguments.
+    """
+    overrides["SQLALCHEMY_DATABASE_URI"] = database_uri
+    conf["benchmark"] = type("BenchmarkConfig", (TestingConfig,), overrides)
+    return create_app("benchmark")
+
+
+def measure(fn, number):
+    """
+    Calls ``fn`` ``number`` times and returns the duration of every call.
+    """
+    samples = []
+    for _ in range(number):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100.0 * len(ordered))))
+    return ordered[index]
+
+
+def summarize(samples):
+    total = sum(samples)
+    return {
+        "n": len(samples),
+        "mean_us": total / len(samples) * 1e6,
+        "p50_us": percentile(samples, 50) * 1e6,
+        "p99_us": percentile(samples, 99) * 1e6,
+        "ops_per_sec": len(samples) / total if total else float("inf"),
+    }
+
+
+def report(name, summary):
+    print(
+        "{:<40} n={n:<8} mean={mean_us:>10.1f}us p50={p50_us:>10.1f}us "
+        "p99={p99_us:>10.1f}us {ops_per_sec:>10.0f} ops/s".format(
+            name, **summary
+        )
+    )
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@contextmanager
+def gunicorn_server(env=None, workers=1, worker_class="gevent", timeout=30):
+    """
+    Runs jam under gunicorn, the way docker/docker-entrypoint.sh does, and
+    yields its base url. ``env`` is added to the environment of the server
+    and of `flask initdb`, which runs first.
+    """
+    port = free_port()
+    server_env = dict(os.environ, FLASK_APP="jam", **(env or {}))
+    subprocess.run(
+        [sys.executable, "-m", "flask", "initdb"],
+        env=server_env,
+        check=True,
+        stdout=subprocess.DEVNULL,
+    )
+    process = subprocess.Popen(
+        [
+            sys.executable,
+            "-m",
+            "gunicorn",
+            "--bind",
+            "127.0.0.1:%d" % port,
+            "--workers",
+            str(workers),
+            "--worker-class",
+            worker_class,
+            "--log-level",
+            "warning",
+            "jam:create_app()",
+        ],
+        env=server_env,
+    )
+    url = "http://127.0.0.1:%d" % port
+    try:
+        deadline = time.time() + timeout
+        while True:
+            try:
+                request(url + "/")
+                break
+            except (OSError, http.client.HTTPException):
+                if time.time() > deadline or process.poll() is not None:
+                    raise RuntimeError("gunicorn did not start")
+                time.sleep(0.2)
+        yield url
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def request(url, method="GET", json_body=None, token=None):
+    """
+    Sends one request and returns (status, parsed json or None).
+    """
+    headers = {"Content-Type": "application/json"}
+    if token:
+        headers["Authorization"] = "Bearer " + token
+    data = None if json_body is None else json.dumps(json_body).encode()
+    req = urllib.request.Request(
+        url, data=data, headers=headers, method=method
+    )
+    try:
+        with urllib.request.urlopen(req) as response:
+            status, body = response.status, response.read()
+    except urllib.error.HTTPError as e:
+        status, body = e.code, e.read()
+    try:
+        return status, json.loads(body)
+    except ValueError:
+        return status, None
@@ -0,0 +1,83 @@
+"""
+Latency of a cheap authenticated endpoint (GET /api/users) while logins
+hammer the password hashing path, with hashing done inline and in each
+PASSWORD_HASH_POOL, under gunicorn's gevent worker.
+
+    python -m benchmarks.hash_load --duration 10 --logins 8
+"""
+import argparse
+import os
+import tempfile
+import threading
+import time
+
+from .common import gunicorn_server, percentile, request
+
+
+def run(pool, duration, login_threads):
+    fd, path = tempfile.mkstemp(suffix=".db")
+    os.close(fd)
+    env = {
+        "JAM_CONFIG": "development",
+        "DEV_DATABASE_URL": "sqlite:///" + path,
+        "PASSWORD_HASH_POOL": pool,
+        # Every login is the same user's.
+        "LOGIN_THROTTLE_BACKEND": "",
+    }
+    credentials = {"username": "bench", "password": "bench"}
+    try:
+        with gunicorn_server(env) as url:
+            request(url + "/api/auth/register", "POST", credentials)
+            _, tokens = request(url + "/api/auth/token", "POST", credentials)
+
+            stop = threading.Event()
+            logins = []
+            probes = []
+
+            def login():
+                while not stop.is_set():
+                    start = time.perf_counter()
+                    request(url + "/api/auth/token", "POST", credentials)
+                    logins.append(time.perf_counter() - start)
+
+            def probe():
+                while not stop.is_set():
+                    start = time.perf_counter()
+                    request(url + "/api/users", token=tokens["access_token"])
+                    probes.append(time.perf_counter() - start)
+                    time.sleep(0.01)
+
+            threads = [threading.Thread(target=probe)] + [
+                threading.Thread(target=login) for _ in range(login_threads)
+            ]
+            for thread in threads:
+                thread.start()
+            time.sleep(duration)
+            stop.set()
+            for thread in threads:
+                thread.join()
+    finally:
+        os.remove(path)
+
+    print(
+        "pool={:<8} logins/s={:>6.1f} GET /api/users p50={:>8.1f}ms "
+        "p99={:>8.1f}ms".format(
+            pool or "inline",
+            len(logins) / duration,
+            percentile(probes, 50) * 1e3,
+            percentile(probes, 99) * 1e3,
+        )
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--logins", type=int, default=8)
+    args = parser.parse_args()
+    for pool in ("", "thread", "process"):
+        run(pool, args.duration, args.logins)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""
+Requests per second with JWT_ON off and identity passed in the "username"
+header: minting a token and rebuilding the request headers on every
+request (how inject_jwt used to work) versus the memoized token handed
+over through the WSGI environ.
+
+    python -m benchmarks.inject_jwt
+"""
+import argparse
+
+from flask import request
+from flask_jwt_extended import get_jwt_identity, jwt_required
+from werkzeug.datastructures import Headers
+
+from jam.utils import mint_access_token
+
+from .common import make_app, measure, report, summarize
+
+
+def legacy_inject_jwt():
+    if (
+        "Authorization" not in request.headers
+        and "username" in request.headers
+    ):
+        access_token, _ = mint_access_token(request.headers.get("username"))
+        req_head = dict(request.headers)
+        req_head["Authorization"] = "Bearer " + access_token
+        request.headers = Headers(req_head)
+
+
+@jwt_required
+def whoami():
+    return get_jwt_identity()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--number", type=int, default=5000)
+    parser.add_argument("--users", type=int, default=10)
+    args = parser.parse_args()
+
+    headers = [
+        {"username": "user{}".format(i), "Accept": "application/json"}
+        for i in range(args.users)
+    ]
+
+    for name, legacy in (("mint per request", True), ("memoized", False)):
+        app = make_app()
+        app.add_url_rule("/whoami", "whoami", whoami)
+        if legacy:
+            app.before_request_funcs[None] = [legacy_inject_jwt]
+        client = app.test_client()
+
+        calls = iter(range(args.number))
+
+        def get():
+            client.get("/whoami", headers=headers[next(calls) % len(headers)])
+
+        report(
+            "GET /whoami ({})".format(name),
+            summarize(measure(get, args.number)),
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""
+CPU spent by a credential stuffing flood of POST /api/auth/token with
+wrong passwords, with login throttling off and on: first against a single
+username, then against a new username on every attempt from one client.
+
+    python -m benchmarks.login_flood --number 300
+"""
+import argparse
+import time
+
+from jam.extensions import db
+from jam.models import UserModel
+
+from .common import make_app
+
+
+def flood(throttle, usernames, number):
+    app = make_app(LOGIN_THROTTLE_BACKEND="memory" if throttle else "")
+    with app.app_context():
+        db.create_all()
+        user = UserModel(username="victim")
+        user.set_password("correct horse battery staple")
+        user.save_to_db()
+
+        client = app.test_client()
+        statuses = {}
+        wall, cpu = time.perf_counter(), time.process_time()
+        for i in range(number):
+            response = client.post(
+                "/api/auth/token",
+                json={"username": usernames(i), "password": str(i)},
+            )
+            statuses[response.status_code] = (
+                statuses.get(response.status_code, 0) + 1
+            )
+        wall = time.perf_counter() - wall
+        cpu = time.process_time() - cpu
+
+    print(
+        "throttle={:<4} requests={:<6} cpu={:>7.2f}s ({:>7.2f}ms/request) "
+        "wall={:>7.2f}s statuses={}".format(
+            "on" if throttle else "off",
+            number,
+            cpu,
+            cpu / number * 1e3,
+            wall,
+            dict(sorted(statuses.items())),
+        )
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--number", type=int, default=300)
+    args = parser.parse_args()
+
+    for name, usernames in (
+        ("one username", lambda i: "victim"),
+        ("one client, many usernames", lambda i: "user{}".format(i)),
+    ):
+        print(name)
+        for throttle in (False, True):
+            flood(throttle, usernames, args.number)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+Sign and verify throughput for each JWT_ALGORITHM: minting and decoding
+access tokens through jam, then the raw signature with the key objects
+parsed once by jam.keys.SigningKeys versus PEM strings, which PyJWT parses
+again on every call.
+
+    python -m benchmarks.signing
+"""
+import argparse
+import shutil
+import tempfile
+
+import jwt
+from cryptography.hazmat.primitives import serialization
+from flask_jwt_extended import decode_token
+
+from jam.extensions import signing_keys
+from jam.keys import generate_private_key, write_private_key
+from jam.utils import mint_access_token
+
+from .common import make_app, measure, report, summarize
+
+
+def pem_pair(key):
+    private = key.private_bytes(
+        serialization.Encoding.PEM,
+        serialization.PrivateFormat.PKCS8,
+        serialization.NoEncryption(),
+    )
+    public = key.public_key().public_bytes(
+        serialization.Encoding.PEM,
+        serialization.PublicFormat.SubjectPublicKeyInfo,
+    )
+    return private, public
+
+
+def bench_raw(algorithm, number, pem_number):
+    private_key = signing_keys.state["private"]
+    public_key = private_key.public_key()
+    private_pem, public_pem = pem_pair(private_key)
+    claims = {"identity": "abc"}
+    token = jwt.encode(claims, private_key, algorithm)
+
+    for name, private, public, n in (
+        ("key object", private_key, public_key, number),
+        ("PEM per call", private_pem, public_pem, pem_number),
+    ):
+        report(
+            "{} sign ({})".format(algorithm, name),
+            summarize(
+                measure(lambda: jwt.encode(claims, private, algorithm), n)
+            ),
+        )
+        report(
+            "{} verify ({})".format(algorithm, name),
+            summarize(
+                measure(
+                    lambda: jwt.decode(token, public, algorithms=[algorithm]),
+                    n,
+                )
+            ),
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--number", type=int, default=2000)
+    parser.add_argument(
+        "--pem-number",
+        type=int,
+        default=50,
+        help="Calls with PEM keys, parsing a RSA key takes tens of ms.",
+    )
+    args = parser.parse_args()
+
+    for algorithm in ("HS256", "RS256", "ES256"):
+        keys_dir = tempfile.mkdtemp()
+        try:
+            if algorithm != "HS256":
+                write_private_key(
+                    keys_dir, algorithm, generate_private_key(algorithm)
+                )
+            app = make_app(JWT_ALGORITHM=algorithm, JWT_KEYS_DIR=keys_dir)
+            with app.test_request_context():
+                token, _ = mint_access_token("abc")
+                report(
+                    "{} mint_access_token".format(algorithm),
+                    summarize(
+                        measure(lambda: mint_access_token("abc"), args.number)
+                    ),
+                )
+                report(
+                    "{} decode_token".format(algorithm),
+                    summarize(
+                        measure(lambda: decode_token(token), args.number)
+                    ),
+                )
+                if algorithm != "HS256":
+                    bench_raw(algorithm, args.number, args.pem_number)
+        finally:
+            shutil.rmtree(keys_dir)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""
+Revocation check latency against a large token table, with and without the
+token indexes.
+
+    python -m benchmarks.token_lookup --rows 1000000
+"""
+import argparse
+import os
+import random
+import tempfile
+import uuid
+from datetime import datetime, timedelta
+
+from jam.extensions import db
+from jam.models import TokenModel
+
+from .common import make_app, measure, report, summarize
+
+
+def populate(rows, users, chunk=50000):
+    now = datetime.now()
+    table = TokenModel.__table__
+    jtis = []
+    for start in range(0, rows, chunk):
+        batch = []
+        for i in range(start, min(rows, start + chunk)):
+            jti = str(uuid.uuid4())
+            jtis.append(jti)
+            batch.append(
+                {
+                    "jti": jti,
+                    "token_type": "access" if i % 2 else "refresh",
+                    "user_identity": "user%d" % (i % users),
+                    "revoked": i % 10 == 0,
+                    "expires": now + timedelta(minutes=i % 1440 - 720),
+                }
+            )
+        db.session.execute(table.insert(), batch)
+        db.session.commit()
+    return jtis
+
+
+def run(jtis, users, lookups, label):
+    def check():
+        TokenModel.is_token_revoked({"jti": random.choice(jtis)})
+
+    def user_tokens():
+        TokenModel.get_user_tokens("user%d" % random.randrange(users))
+
+    report("is_token_revoked " + label, summarize(measure(check, lookups)))
+    report(
+        "get_user_tokens " + label,
+        summarize(measure(user_tokens, max(1, lookups // 10))),
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=1000000)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--lookups", type=int, default=10000)
+    parser.add_argument(
+        "--scan-lookups",
+        type=int,
+        default=20,
+        help="Lookups to run once the indexes are dropped.",
+    )
+    parser.add_argument(
+        "--database-uri",
+        help="Defaults to a temporary sqlite file.",
+    )
+    args = parser.parse_args()
+
+    path = None
+    uri = args.database_uri
+    if uri is None:
+        fd, path = tempfile.mkstemp(suffix=".db")
+        os.close(fd)
+        uri = "sqlite:///" + path
+
+    # Measure the database, not the revocation cache.
+    app = make_app(uri, REVOCATION_CACHE_SIZE=0)
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        print("Inserting %d tokens..." % args.rows)
+        jtis = populate(args.rows, args.users)
+
+        run(jtis, args.users, args.lookups, "(indexed)")
+
+        for index in TokenModel.__table__.indexes:
+            index.drop(db.engine)
+        run(jtis, args.users, args.scan_lookups, "(no index)")
+
+        db.drop_all()
+    if path is not None:
+        os.remove(path)
+
+
+if __name__ == "__main__":
+    main()
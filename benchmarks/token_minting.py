@@ -0,0 +1,66 @@
+"""
+Cost of issuing a token pair, decoding freshly minted tokens again to
+persist them versus persisting the claims returned at creation time, and
+the resulting login throughput.
+
+    python -m benchmarks.token_minting
+"""
+import argparse
+
+from flask import current_app
+from flask_jwt_extended import create_access_token, create_refresh_token
+
+from jam.extensions import db
+from jam.models import TokenModel, UserModel
+from jam.utils import mint_access_token, mint_refresh_token
+
+from .common import make_app, measure, report, summarize
+
+
+def issue_decoding():
+    identity_claim = current_app.config["JWT_IDENTITY_CLAIM"]
+    for token in (create_access_token("abc"), create_refresh_token("abc")):
+        TokenModel.save_encoded_token_to_db(token, identity_claim)
+
+
+def issue_minting():
+    identity_claim = current_app.config["JWT_IDENTITY_CLAIM"]
+    for _, claims in (mint_access_token("abc"), mint_refresh_token("abc")):
+        TokenModel.save_decoded_token_to_db(claims, identity_claim)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--number", type=int, default=2000)
+    parser.add_argument("--logins", type=int, default=50)
+    args = parser.parse_args()
+
+    # Every login is the same user's.
+    app = make_app(REVOCATION_CACHE_SIZE=0, LOGIN_THROTTLE_BACKEND="")
+    with app.test_request_context():
+        db.create_all()
+        user = UserModel(username="abc")
+        user.set_password("123")
+        user.save_to_db()
+
+        report(
+            "issue pair (create + decode)",
+            summarize(measure(issue_decoding, args.number)),
+        )
+        report(
+            "issue pair (mint with claims)",
+            summarize(measure(issue_minting, args.number)),
+        )
+
+        client = app.test_client()
+
+        def login():
+            client.post(
+                "/api/auth/token", json={"username": "abc", "password": "123"}
+            )
+
+        report("POST /api/auth/token", summarize(measure(login, args.logins)))
+
+
+if __name__ == "__main__":
+    main()
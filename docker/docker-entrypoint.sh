@@ -5,7 +5,14 @@ set -eo pipefail
 if [ "${#}" -ne 0 ]; then
     exec "${@}"
 else
+    # Metrics of every worker are shared through this directory, which must
+    # start empty.
+    export prometheus_multiproc_dir="${prometheus_multiproc_dir:-/tmp/jam-metrics}"
+    rm -rf "${prometheus_multiproc_dir}"
+    mkdir -p "${prometheus_multiproc_dir}"
+
     gunicorn \
+        --config /app/docker/gunicorn.conf.py \
         --bind  "0.0.0.0:${JAM_PORT}" \
         --access-logfile '-' \
         --error-logfile '-' \
@@ -0,0 +1,10 @@
+# Loaded by docker-entrypoint.sh, on top of its command line options.
+
+
+def child_exit(server, worker):
+    # Drop the live gauges of dead workers from the multiprocess metrics.
+    try:
+        from prometheus_client import multiprocess
+    except ImportError:
+        return
+    multiprocess.mark_process_dead(worker.pid)
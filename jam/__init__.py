@@ -1,14 +1,39 @@
 import os
+import time
+from concurrent.futures import ProcessPoolExecutor
 
 import click
-from flask import Flask, request
-from flask_jwt_extended import create_access_token
-from werkzeug.datastructures import Headers
+from flask import Flask, current_app, request
+from werkzeug.security import generate_password_hash
 
 from jam.api import api_blueprint
-from jam.extensions import db, jwt, migrate
-from jam.models import TokenModel
+from jam.bulk import (
+    USER_COLUMNS,
+    forge_users,
+    guess_format,
+    import_users,
+    read_users,
+    write_users,
+)
+from jam.cache import TTLCache
+from jam.extensions import (
+    db,
+    jwt,
+    login_throttle,
+    metrics,
+    migrate,
+    password_hasher,
+    query_tracker,
+    revocation,
+    signing_keys,
+)
+from jam.hashing import normalize_method, time_method
+from jam.keys import generate_private_key, new_kid, write_private_key
+from jam.metrics import timed
+from jam.models import TokenGenerationModel, TokenModel, UserModel
+from jam.scheduler import TokenPruner
 from jam.settings import conf
+from jam.utils import init_jwt_verifiers, mint_access_token
 
 
 def create_app(config_name=None):
@@ -23,6 +48,7 @@ def create_app(config_name=None):
     register_commands(app)
     register_blueprints(app)
     register_hooks(app)
+    register_scheduler(app)
     # register_errors(app)
 
     return app
@@ -34,15 +60,55 @@ def register_blueprints(app) -> None:
 
 def register_extensions(app):
     db.init_app(app)
+    query_tracker.init_app(app)
     migrate.init_app(app, db, os.path.join("jam", "migrations"))
     jwt.init_app(app)
+    revocation.init_app(app)
+    password_hasher.init_app(app)
+    signing_keys.init_app(app)
+    login_throttle.init_app(app)
+    metrics.init_app(app)
+    init_jwt_verifiers(app)
+
+    jwt.encode_key_loader(signing_keys.encode_key)
+    jwt.decode_key_loader(signing_keys.decode_key)
+    jwt.additional_headers_loader(signing_keys.headers)
+
+    @jwt.user_claims_loader
+    def add_generation_claim(identity):
+        if current_app.config["REVOCATION_STRATEGY"] == "generation":
+            return {
+                "gen": TokenGenerationModel.get_generation(
+                    identity, cached=False
+                )
+            }
+        return {}
 
     @jwt.token_in_blacklist_loader
     def check_if_token_revoked(decoded_token):
-        return TokenModel.is_token_revoked(decoded_token)
+        strategy = current_app.config["REVOCATION_STRATEGY"]
+        with timed("revocation_check_seconds", strategy=strategy):
+            if strategy == "generation":
+                if TokenGenerationModel.is_token_outdated(decoded_token):
+                    return True
+            return TokenModel.is_token_revoked(decoded_token)
+
+
+def register_scheduler(app):
+    if app.config.get("TOKEN_PRUNE_INTERVAL"):
+        pruner = TokenPruner(app)
+        pruner.start()
+        app.extensions["token_pruner"] = pruner
 
 
 def register_hooks(app):
+    app.config.setdefault("INJECTED_TOKEN_CACHE_SIZE", 10000)
+    app.config.setdefault("INJECTED_TOKEN_MARGIN", 60)
+    injected_tokens = TTLCache(
+        maxsize=app.config["INJECTED_TOKEN_CACHE_SIZE"]
+    )
+    app.extensions["injected_tokens"] = injected_tokens
+
     @app.before_request
     def inject_jwt():
         """
@@ -54,18 +120,28 @@ def register_hooks(app):
 
         JWT_ON = False
         JWT_BLACKLIST_ENABLED = False
+
+        The token minted for a username is reused until shortly before it
+        expires, and is handed over through the WSGI environ, which
+        request.headers reads from.
         """
+        environ = request.environ
         if (
             not app.config.get("JWT_ON", True)
-            and "Authorization" not in request.headers
-            and "username" in request.headers
+            and "HTTP_AUTHORIZATION" not in environ
+            and "HTTP_USERNAME" in environ
         ):
-            access_token = create_access_token(
-                identity=request.headers.get("username")
-            )
-            req_head = dict(request.headers)
-            req_head["Authorization"] = "Bearer " + access_token
-            request.headers = Headers(req_head)
+            username = environ["HTTP_USERNAME"]
+            access_token = injected_tokens.get(username)
+            if access_token is None:
+                access_token, claims = mint_access_token(username)
+                if "exp" in claims:
+                    injected_tokens.set(
+                        username,
+                        access_token,
+                        claims["exp"] - app.config["INJECTED_TOKEN_MARGIN"],
+                    )
+            environ["HTTP_AUTHORIZATION"] = "Bearer " + access_token
 
 
 def register_errors(app):
@@ -102,91 +178,223 @@ def register_commands(app):
         click.echo("Initialized database.")
 
     @app.cli.command()
-    def prunetoken():
+    @click.option(
+        "--batch-size",
+        type=int,
+        help="Rows deleted per transaction, default PRUNE_BATCH_SIZE.",
+    )
+    @click.option(
+        "--pause",
+        type=float,
+        help="Seconds to sleep between batches, default PRUNE_PAUSE.",
+    )
+    @click.option(
+        "--dry-run", is_flag=True, help="Only count the expired tokens."
+    )
+    def prunetoken(batch_size, pause, dry_run):
         """Delete all the expired tokens in the db."""
-        TokenModel.prune_database_tokens()
-        click.echo("Deleted expired tokens.")
-
-
-#     @app.cli.command()
-#     @click.option(
-#         "--username", prompt=True, help="The username used to login."
-#     )
-#     @click.option(
-#         "--password",
-#         prompt=True,
-#         hide_input=True,
-#         confirmation_prompt=True,
-#         help="The password used to login.",
-#     )
-#     def init(username, password):
-#         """Building Bluelog, just for you."""
-
-#         click.echo("Initializing the database...")
-#         db.create_all()
-
-#         admin = Admin.query.first()
-#         if admin is not None:
-#             click.echo("The administrator already exists, updating...")
-#             admin.username = username
-#             admin.set_password(password)
-#         else:
-#             click.echo("Creating the temporary administrator account...")
-#             admin = Admin(
-#                 username=username,
-#                 blog_title="Bluelog",
-#                 blog_sub_title="No, I'm the real thing.",
-#                 name="Admin",
-#                 about="Anything about you.",
-#             )
-#             admin.set_password(password)
-#             db.session.add(admin)
-
-#         category = Category.query.first()
-#         if category is None:
-#             click.echo("Creating the default category...")
-#             category = Category(name="Default")
-#             db.session.add(category)
-
-#         db.session.commit()
-#         click.echo("Done.")
-
-#     @app.cli.command()
-#     @click.option(
-#         "--category", default=10, help="Quantity of categories, default 10."
-#     )
-#     @click.option(
-#         "--post", default=50, help="Quantity of posts, default 50."
-#     )
-#     @click.option(
-#         "--comment", default=500, help="Quantity of comments, default 500."
-#     )
-#     def forge(category, post, comment):
-#         """Generate fake data."""
-#         from bluelog.fakes import (
-#             fake_admin,
-#             fake_categories,
-#             fake_posts,
-#             fake_comments,
-#             fake_links,
-#         )
-
-#         db.drop_all()
-#         db.create_all()
-
-#         click.echo("Generating the administrator...")
-#         fake_admin()
-
-#         click.echo("Generating %d categories..." % category)
-#         fake_categories(category)
-
-#         click.echo("Generating %d posts..." % post)
-#         fake_posts(post)
-
-#         click.echo("Generating %d comments..." % comment)
-#         fake_comments(comment)
-
-#         click.echo("Generating links...")
-#         fake_links()
-
-#         click.echo("Done.")
+        if dry_run:
+            count = TokenModel.prune_database_tokens(dry_run=True)
+            click.echo("{} expired token(s) would be deleted.".format(count))
+            return
+
+        def progress(deleted):
+            click.echo("Deleted {} token(s)...".format(deleted))
+
+        start = time.time()
+        deleted = TokenModel.prune_database_tokens(
+            batch_size=batch_size or app.config["PRUNE_BATCH_SIZE"],
+            pause=app.config["PRUNE_PAUSE"] if pause is None else pause,
+            progress=progress,
+        )
+        elapsed = time.time() - start
+        click.echo(
+            "Deleted {} expired token(s) in {:.2f}s ({:.0f} rows/s).".format(
+                deleted, elapsed, deleted / elapsed if elapsed else 0
+            )
+        )
+
+    @app.cli.command()
+    @click.option(
+        "--target-ms", default=250.0, help="Wanted duration of one hash."
+    )
+    @click.option(
+        "--digest",
+        help="PBKDF2 digest to tune, default the one in PASSWORD_HASH_METHOD.",
+    )
+    def hashbench(target_ms, digest):
+        """Time password hashing and suggest a PBKDF2 cost."""
+        method = normalize_method(app.config["PASSWORD_HASH_METHOD"])
+        click.echo(
+            "Current {}: {:.1f}ms per hash.".format(
+                method, time_method(method) * 1000
+            )
+        )
+        if digest is None:
+            if not method.startswith("pbkdf2:"):
+                click.echo("Only PBKDF2 methods can be tuned.")
+                return
+            digest = method.split(":")[1]
+
+        probe = 10000
+        elapsed = time_method("pbkdf2:{}:{}".format(digest, probe))
+        iterations = int(probe * target_ms / 1000.0 / elapsed)
+        iterations = max(1000, iterations // 1000 * 1000)
+        suggested = "pbkdf2:{}:{}".format(digest, iterations)
+        click.echo(
+            "Suggested PASSWORD_HASH_METHOD={} ({:.1f}ms per hash).".format(
+                suggested, time_method(suggested) * 1000
+            )
+        )
+
+    @app.cli.command()
+    @click.option("--kid", help="Key id, default the current UTC time.")
+    @click.option(
+        "--algorithm", help="RS256 or ES256, default JWT_ALGORITHM."
+    )
+    def genkey(kid, algorithm):
+        """Add a private key to JWT_KEYS_DIR."""
+        algorithm = algorithm or app.config["JWT_ALGORITHM"]
+        path = write_private_key(
+            app.config["JWT_KEYS_DIR"],
+            kid or new_kid(),
+            generate_private_key(algorithm),
+        )
+        click.echo(
+            "Wrote {}. New tokens are signed with it once jam restarts, "
+            "unless JWT_KEY_ID names another key.".format(path)
+        )
+
+    @app.cli.group()
+    def users():
+        """Bulk import and export users."""
+
+    @users.command("export")
+    @click.argument("path", type=click.Path(dir_okay=False, allow_dash=True))
+    @click.option(
+        "--format",
+        "fmt",
+        type=click.Choice(["csv", "ndjson"]),
+        help="Default guessed from the file extension.",
+    )
+    def export_users(path, fmt):
+        """Write all the users, password hashes included, to a file."""
+        with click.open_file(path, "w") as f:
+            count = write_users(
+                f, guess_format(path, fmt), UserModel.iter_all(USER_COLUMNS)
+            )
+        click.echo("Exported {} user(s).".format(count), err=path == "-")
+
+    @users.command("import")
+    @click.argument(
+        "path", type=click.Path(exists=True, dir_okay=False, allow_dash=True)
+    )
+    @click.option(
+        "--format",
+        "fmt",
+        type=click.Choice(["csv", "ndjson"]),
+        help="Default guessed from the file extension.",
+    )
+    @click.option("--batch-size", default=1000, help="Users per INSERT.")
+    @click.option(
+        "--workers",
+        type=int,
+        help="Password hashing processes, default one per CPU.",
+    )
+    def import_users_command(path, fmt, batch_size, workers):
+        """
+        Create users from a file with username and password (or
+        password_hash) columns, skipping existing usernames.
+        """
+
+        def progress(imported, skipped):
+            click.echo(
+                "Imported {} user(s), skipped {}...".format(imported, skipped)
+            )
+
+        start = time.time()
+        with click.open_file(path) as f, ProcessPoolExecutor(
+            workers
+        ) as executor:
+            imported, skipped = import_users(
+                read_users(f, guess_format(path, fmt)),
+                executor,
+                batch_size=batch_size,
+                progress=progress,
+            )
+        elapsed = time.time() - start
+        click.echo(
+            "Imported {} user(s), skipped {} in {:.2f}s "
+            "({:.0f} users/s).".format(
+                imported,
+                skipped,
+                elapsed,
+                imported / elapsed if elapsed else 0,
+            )
+        )
+
+    @app.cli.command()
+    @click.option("--users", default=1000, help="Users to create.")
+    @click.option("--tokens", default=10, help="Tokens per user.")
+    @click.option(
+        "--expired-ratio", default=0.5, help="Share of expired tokens."
+    )
+    @click.option(
+        "--revoked-ratio", default=0.05, help="Share of revoked tokens."
+    )
+    @click.option("--prefix", default="forge", help="Username prefix.")
+    @click.option("--password", default="forge", help="Every user's one.")
+    @click.option(
+        "--hash-method",
+        help="Default PASSWORD_HASH_METHOD, e.g. pbkdf2:sha256:1 to go fast.",
+    )
+    @click.option("--batch-size", default=10000, help="Rows per INSERT.")
+    @click.option("--seed", type=int, help="Seed for repeatable data.")
+    def forge(
+        users,
+        tokens,
+        expired_ratio,
+        revoked_ratio,
+        prefix,
+        password,
+        hash_method,
+        batch_size,
+        seed,
+    ):
+        """Generate fake users and tokens."""
+        # One hash is shared by all the users, hashing dominates otherwise.
+        password_hash = generate_password_hash(
+            password,
+            method=hash_method or app.config["PASSWORD_HASH_METHOD"],
+            salt_length=app.config["PASSWORD_SALT_LENGTH"],
+        )
+
+        def progress(users_done, tokens_done):
+            click.echo(
+                "Created {} user(s), {} token(s)...".format(
+                    users_done, tokens_done
+                )
+            )
+
+        start = time.time()
+        users_done, tokens_done = forge_users(
+            users,
+            tokens,
+            password_hash,
+            prefix=prefix,
+            expired_ratio=expired_ratio,
+            revoked_ratio=revoked_ratio,
+            batch_size=batch_size,
+            progress=progress,
+            seed=seed,
+        )
+        elapsed = time.time() - start
+        click.echo(
+            "Created {} user(s) and {} token(s) in {:.2f}s "
+            "({:.0f} rows/s).".format(
+                users_done,
+                tokens_done,
+                elapsed,
+                (users_done + tokens_done) / elapsed if elapsed else 0,
+            )
+        )
@@ -1,8 +1,28 @@
 from flask import Blueprint
 from flask_cors import CORS
 
+from jam.exceptions import HashingOverloaded, LoginThrottled
+
 api_blueprint = Blueprint("api", __name__)
 
 CORS(api_blueprint)
 
-from .resources import auth, user  # noqa
+
+@api_blueprint.errorhandler(HashingOverloaded)
+def hashing_overloaded(e):
+    return (
+        {"msg": "Too many logins in progress, retry later"},
+        503,
+        {"Retry-After": "1"},
+    )
+
+
+@api_blueprint.errorhandler(LoginThrottled)
+def login_throttled(e):
+    return (
+        {"msg": "Too many login attempts, retry later"},
+        429,
+        {"Retry-After": str(e.retry_after)},
+    )
+
+from .resources import auth, job, user  # noqa
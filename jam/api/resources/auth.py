@@ -1,17 +1,52 @@
+import time
+
 from flask import request, current_app, jsonify
 from flask.views import MethodView
 from flask_jwt_extended import (
+    decode_token,
     jwt_required,
     jwt_refresh_token_required,
-    create_access_token,
-    create_refresh_token,
     get_jwt_identity,
     get_raw_jwt,
 )
+from flask_jwt_extended.exceptions import JWTExtendedException
+from jwt.exceptions import InvalidTokenError
+from werkzeug.http import http_date
 
 from jam.api import api_blueprint
 from jam.exceptions import TokenNotFound
-from jam.models import UserModel, TokenModel
+from jam.extensions import login_throttle, signing_keys
+from jam.models import UserModel, TokenModel, TokenGenerationModel
+from jam.utils import (
+    get_page_args,
+    mint_access_token,
+    mint_refresh_token,
+    next_page_headers,
+)
+
+
+_BOOL_ARGS = {
+    "1": True,
+    "true": True,
+    "yes": True,
+    "0": False,
+    "false": False,
+    "no": False,
+}
+
+
+def _get_bool_arg(name):
+    """
+    Reads a boolean query parameter, None when it is missing. Raises
+    ValueError for anything else than 1/true/yes or 0/false/no.
+    """
+    value = request.args.get(name)
+    if value is None:
+        return None
+    try:
+        return _BOOL_ARGS[value.lower()]
+    except KeyError:
+        raise ValueError("{!r} must be a boolean".format(name))
 
 
 class AuthRegisterAPI(MethodView):
@@ -30,6 +65,7 @@ class AuthRegisterAPI(MethodView):
         if not password:
             return {"msg": "Missing password parameter"}, 400
 
+        login_throttle.check(username)
         user = UserModel.find_by_username(username)
         if not user:
             try:
@@ -71,10 +107,32 @@ class AuthTokenAPI(MethodView):
 
     @jwt_required
     def get(self):
+        try:
+            limit, cursor = get_page_args()
+        except ValueError:
+            return {"msg": "Invalid 'limit' or 'cursor' parameter"}, 400
+        try:
+            filters = {
+                "token_type": request.args.get("type"),
+                "revoked": _get_bool_arg("revoked"),
+                "active_only": _get_bool_arg("active_only") or False,
+            }
+            with_count = _get_bool_arg("count")
+        except ValueError as e:
+            return {"msg": "Invalid {} parameter".format(e.args[0])}, 400
+
         current_user = get_jwt_identity()
-        all_tokens = TokenModel.get_user_tokens(current_user)
-        ret = [token.to_dict() for token in all_tokens]
-        return jsonify(ret), 200
+        tokens, next_cursor = TokenModel.page_user_tokens(
+            current_user, limit, cursor, **filters
+        )
+        headers = next_page_headers(next_cursor)
+        # Counting scans the user's whole token history, so it is only done
+        # when asked for, and on the first page only.
+        if with_count and cursor is None:
+            headers["X-Total-Count"] = str(
+                TokenModel.count_user_tokens(current_user, **filters)
+            )
+        return jsonify(tokens), 200, headers
 
     def post(self):
         if not request.is_json:
@@ -87,23 +145,23 @@ class AuthTokenAPI(MethodView):
         if not password:
             return {"msg": "Missing password parameter"}, 400
 
+        login_throttle.check(username)
         user = UserModel.find_by_username(username)
 
         if user and user.validate_password(password):
-            access_token = create_access_token(identity=username)
-            refresh_token = create_refresh_token(identity=username)
+            access_token, access_claims = mint_access_token(username)
+            refresh_token, refresh_claims = mint_refresh_token(username)
 
-            TokenModel.save_encoded_token_to_db(
-                access_token, current_app.config["JWT_IDENTITY_CLAIM"]
-            )
-            TokenModel.save_encoded_token_to_db(
-                refresh_token, current_app.config["JWT_IDENTITY_CLAIM"]
+            TokenModel.save_decoded_tokens_to_db(
+                [access_claims, refresh_claims],
+                current_app.config["JWT_IDENTITY_CLAIM"],
             )
 
             return (
                 {"access_token": access_token, "refresh_token": refresh_token},
                 200,
             )
+        login_throttle.failed(username)
         return "Invalid username or password.", 400
 
 
@@ -122,9 +180,9 @@ class AuthTokenRefreshAPI(MethodView):
     @jwt_refresh_token_required
     def post(self):
         current_user = get_jwt_identity()
-        access_token = create_access_token(identity=current_user)
-        TokenModel.save_encoded_token_to_db(
-            access_token, current_app.config["JWT_IDENTITY_CLAIM"]
+        access_token, access_claims = mint_access_token(current_user)
+        TokenModel.save_decoded_token_to_db(
+            access_claims, current_app.config["JWT_IDENTITY_CLAIM"]
         )
         return {"access_token": access_token}
 
@@ -171,6 +229,63 @@ api_blueprint.add_url_rule(
 )
 
 
+class AuthTokenBatchRevokeAPI(MethodView):
+    """
+    Provide a way for a user to revoke/unrevoke many of their tokens at once,
+    e.g. to log out everywhere
+    """
+
+    @jwt_required
+    def post(self):
+        json_data = request.get_json(silent=True) or {}
+        revoke = json_data.get("revoke", True)
+        if not isinstance(revoke, bool):
+            return jsonify({"msg": "'revoke' must be a boolean"}), 400
+
+        current_user = get_jwt_identity()
+        token_ids = json_data.get("token_ids", None)
+        user_identity = json_data.get("user_identity", None)
+        if token_ids is None and user_identity is None:
+            return (
+                jsonify({"msg": "Missing 'token_ids' or 'user_identity'"}),
+                400,
+            )
+        if token_ids is not None and (
+            not isinstance(token_ids, list)
+            or not all(isinstance(x, int) for x in token_ids)
+        ):
+            return jsonify({"msg": "'token_ids' must be a list of ids"}), 400
+        if user_identity is not None and user_identity != current_user:
+            return jsonify({"msg": "Can only revoke your own tokens"}), 403
+
+        if (
+            revoke
+            and token_ids is None
+            and current_app.config["REVOCATION_STRATEGY"] == "generation"
+        ):
+            TokenGenerationModel.bump(current_user)
+            return jsonify({"msg": "All tokens revoked"}), 200
+
+        count = TokenModel.revoke_tokens(current_user, token_ids, revoke)
+        return (
+            jsonify(
+                {
+                    "msg": "{} token(s) {}".format(
+                        count, "revoked" if revoke else "unrevoked"
+                    )
+                }
+            ),
+            200,
+        )
+
+
+api_blueprint.add_url_rule(
+    "/auth/token/revoke",
+    view_func=AuthTokenBatchRevokeAPI.as_view("auth_token_batch_revoke_api"),
+    methods=["POST"],
+)
+
+
 class AuthLogoutAccessAPI(MethodView):
     """
     User Logout Access Resource
@@ -178,9 +293,11 @@ class AuthLogoutAccessAPI(MethodView):
 
     @jwt_required
     def post(self):
-        jti = get_raw_jwt()["jti"]
+        raw_jwt = get_raw_jwt()
         try:
-            TokenModel.revoke_token(jti=jti)
+            TokenModel.revoke_token(
+                jti=raw_jwt["jti"], exp=raw_jwt.get("exp")
+            )
             return jsonify({"msg": "Access token revoked."}), 200
         except TokenNotFound:
             return jsonify({"msg": "The specified token was not found"}), 404
@@ -200,9 +317,11 @@ class AuthLogoutRefreshAPI(MethodView):
 
     @jwt_refresh_token_required
     def post(self):
-        jti = get_raw_jwt()["jti"]
+        raw_jwt = get_raw_jwt()
         try:
-            TokenModel.revoke_token(jti=jti)
+            TokenModel.revoke_token(
+                jti=raw_jwt["jti"], exp=raw_jwt.get("exp")
+            )
             return jsonify({"msg": "Refresh token revoked."}), 200
         except TokenNotFound:
             return jsonify({"msg": "The specified token was not found"}), 404
@@ -213,3 +332,89 @@ api_blueprint.add_url_rule(
     view_func=AuthLogoutRefreshAPI.as_view("auth_logout_refresh_api"),
     methods=["POST"],
 )
+
+
+class AuthTokenIntrospectAPI(MethodView):
+    """
+    Token Introspection Resource, tells other services whether a batch of
+    tokens is valid, with their claims
+    """
+
+    @jwt_required
+    def post(self):
+        json_data = request.get_json(silent=True) or {}
+        tokens = json_data.get("tokens", None)
+        max_tokens = current_app.config["INTROSPECT_MAX_TOKENS"]
+        if not isinstance(tokens, list) or not tokens:
+            return {"msg": "'tokens' must be a list of tokens"}, 400
+        if len(tokens) > max_tokens:
+            return {"msg": "At most {} tokens".format(max_tokens)}, 400
+
+        decoded_tokens = {}
+        for index, token in enumerate(tokens):
+            try:
+                decoded_tokens[index] = decode_token(token)
+            except (InvalidTokenError, JWTExtendedException):
+                pass
+
+        check_generation = (
+            current_app.config["REVOCATION_STRATEGY"] == "generation"
+        )
+        revoked = TokenModel.are_tokens_revoked(list(decoded_tokens.values()))
+        for (index, decoded_token), is_revoked in zip(
+            list(decoded_tokens.items()), revoked
+        ):
+            if is_revoked or (
+                check_generation
+                and TokenGenerationModel.is_token_outdated(decoded_token)
+            ):
+                del decoded_tokens[index]
+
+        results = [
+            dict(decoded_tokens[index], active=True)
+            if index in decoded_tokens
+            else {"active": False}
+            for index in range(len(tokens))
+        ]
+
+        # Answers can be reused until the first active token expires, but
+        # no longer than a revoke may take to reach every worker.
+        max_age = current_app.config["REVOCATION_CACHE_TTL"]
+        now = time.time()
+        for decoded_token in decoded_tokens.values():
+            if "exp" in decoded_token:
+                max_age = min(max_age, int(decoded_token["exp"] - now))
+        max_age = max(max_age, 0)
+        headers = {
+            "Cache-Control": "private, max-age={}".format(max_age),
+            "Expires": http_date(now + max_age),
+        }
+        return jsonify({"tokens": results}), 200, headers
+
+
+api_blueprint.add_url_rule(
+    "/auth/token/introspect",
+    view_func=AuthTokenIntrospectAPI.as_view("auth_token_introspect_api"),
+    methods=["POST"],
+)
+
+
+class AuthJWKSAPI(MethodView):
+    """
+    Public Keys Resource, for other services to verify tokens themselves
+    """
+
+    def get(self):
+        max_age = current_app.config["JWKS_MAX_AGE"]
+        return (
+            signing_keys.jwks(),
+            200,
+            {"Cache-Control": "public, max-age={}".format(max_age)},
+        )
+
+
+api_blueprint.add_url_rule(
+    "/auth/jwks",
+    view_func=AuthJWKSAPI.as_view("auth_jwks_api"),
+    methods=["GET"],
+)
@@ -0,0 +1,23 @@
+from flask.views import MethodView
+from flask_jwt_extended import jwt_required
+
+from jam.api import api_blueprint
+from jam.models import JobModel
+
+
+class JobAPI(MethodView):
+    """
+    Background Job Resource
+    """
+
+    @jwt_required
+    def get(self, job_id):
+        job = JobModel.find_by_id(job_id)
+        if job is None:
+            return {"msg": "The specified job was not found"}, 404
+        return job.to_dict()
+
+
+api_blueprint.add_url_rule(
+    "/jobs/<job_id>", view_func=JobAPI.as_view("job_api"), methods=["GET"],
+)
@@ -1,8 +1,20 @@
+import json
+
+from flask import (
+    Response,
+    current_app,
+    request,
+    stream_with_context,
+    url_for,
+)
 from flask.views import MethodView
 from flask_jwt_extended import jwt_required
 
 from jam.api import api_blueprint
+from jam.extensions import db
+from jam.jobs import start_job
 from jam.models import UserModel
+from jam.utils import get_page_args, next_page_headers, wants_ndjson
 
 
 class UserAPI(MethodView):
@@ -12,11 +24,40 @@ class UserAPI(MethodView):
 
     @jwt_required
     def get(self):
-        return UserModel.return_all()
+        if wants_ndjson():
+            lines = (json.dumps(user) + "\n" for user in UserModel.iter_all())
+            return Response(
+                stream_with_context(lines), mimetype="application/x-ndjson"
+            )
+
+        try:
+            limit, cursor = get_page_args()
+        except ValueError:
+            return {"msg": "Invalid 'limit' or 'cursor' parameter"}, 400
+        page, next_cursor = UserModel.return_page(limit, cursor)
+        page["next_cursor"] = next_cursor
+        return page, 200, next_page_headers(next_cursor)
 
     @jwt_required
     def delete(self):
-        return UserModel.delete_all()
+        batch_size = current_app.config["DELETE_BATCH_SIZE"]
+        if request.args.get("async", "").lower() in ("1", "true", "yes"):
+            job = start_job(
+                current_app._get_current_object(),
+                "delete_users",
+                UserModel.delete_all,
+                batch_size,
+            )
+            location = url_for("api.job_api", job_id=job.id)
+            return job.to_dict(), 202, {"Location": location}
+
+        try:
+            num_rows_deleted = UserModel.delete_all(batch_size)
+        except Exception:
+            db.session.rollback()
+            current_app.logger.exception("Deleting users failed")
+            return {"message": "Something went wrong"}, 500
+        return {"message": "{} row(s) deleted".format(num_rows_deleted)}
 
 
 api_blueprint.add_url_rule(
@@ -0,0 +1,236 @@
+import csv
+import json
+import random
+import re
+import uuid
+from datetime import datetime, timedelta
+from functools import partial
+from itertools import islice
+
+from flask import current_app
+from flask_jwt_extended.config import config as jwt_config
+from werkzeug.security import generate_password_hash
+
+from jam.extensions import db
+from jam.models import TokenModel, UserModel
+
+USER_COLUMNS = ("username", "email", "name", "password_hash")
+
+
+def guess_format(path, fmt=None):
+    if fmt:
+        return fmt
+    return "ndjson" if path.endswith((".ndjson", ".jsonl")) else "csv"
+
+
+def read_users(stream, fmt):
+    """
+    Yields the users of a CSV (with a header line) or NDJSON stream as
+    dicts, one at a time.
+    """
+    if fmt == "csv":
+        for row in csv.DictReader(stream):
+            yield row
+    else:
+        for line in stream:
+            if line.strip():
+                yield json.loads(line)
+
+
+def write_users(stream, fmt, users):
+    """
+    Writes users, an iterable of dicts, to a stream as CSV or NDJSON.
+    Returns the number of written users.
+    """
+    count = 0
+    if fmt == "csv":
+        writer = csv.DictWriter(stream, fieldnames=USER_COLUMNS)
+        writer.writeheader()
+        for count, user in enumerate(users, 1):
+            writer.writerow(user)
+    else:
+        for count, user in enumerate(users, 1):
+            stream.write(json.dumps(user) + "\n")
+    return count
+
+
+def import_users(users, executor, batch_size=1000, progress=None):
+    """
+    Inserts users, an iterable of dicts with a username and either a
+    password or a password_hash, batch_size at a time. Users missing
+    either are skipped.
+
+    Each batch costs one query to find the usernames that already exist,
+    which are skipped along with duplicates inside the batch, one
+    multi-row INSERT and one commit. Passwords are hashed with the
+    configured policy by executor, e.g. a ProcessPoolExecutor.
+    progress, if given, is called with (imported, skipped) after every
+    batch. Returns (imported, skipped).
+    """
+    hasher = partial(
+        generate_password_hash,
+        method=current_app.config["PASSWORD_HASH_METHOD"],
+        salt_length=current_app.config["PASSWORD_SALT_LENGTH"],
+    )
+    table = UserModel.__table__
+    users = iter(users)
+    imported = skipped = 0
+    while True:
+        batch = list(islice(users, batch_size))
+        if not batch:
+            break
+
+        rows = {}
+        for user in batch:
+            username = user.get("username")
+            has_password = user.get("password") or user.get("password_hash")
+            if username and has_password and username not in rows:
+                rows[username] = user
+        existing = {
+            username
+            for username, in db.session.query(UserModel.username).filter(
+                UserModel.username.in_(list(rows))
+            )
+        }
+        rows = [row for name, row in rows.items() if name not in existing]
+
+        to_hash = [row for row in rows if not row.get("password_hash")]
+        hashes = executor.map(
+            hasher,
+            [row["password"] for row in to_hash],
+            chunksize=max(1, len(to_hash) // 32),
+        )
+        for row, pwhash in zip(to_hash, hashes):
+            row["password_hash"] = pwhash
+
+        if rows:
+            db.session.execute(
+                table.insert(),
+                [
+                    {
+                        column: row.get(column) or None
+                        for column in USER_COLUMNS
+                    }
+                    for row in rows
+                ],
+            )
+            db.session.commit()
+        imported += len(rows)
+        skipped += len(batch) - len(rows)
+        if progress is not None:
+            progress(imported, skipped)
+    return imported, skipped
+
+
+def _next_forged_number(prefix):
+    # The highest number taken plus one, other names starting with prefix
+    # (e.g. "forgery" for "forge") don't count.
+    pattern = re.compile(re.escape(prefix) + r"(\d+)\Z")
+    escaped = (
+        prefix.replace("\\", "\\\\")
+        .replace("%", "\\%")
+        .replace("_", "\\_")
+    )
+    query = db.session.query(UserModel.username).filter(
+        UserModel.username.like(escaped + "%", escape="\\")
+    )
+    highest = -1
+    for username, in query.yield_per(10000):
+        match = pattern.match(username)
+        if match:
+            highest = max(highest, int(match.group(1)))
+    return highest + 1
+
+
+def forge_users(
+    count,
+    tokens_per_user,
+    password_hash,
+    prefix="forge",
+    expired_ratio=0.5,
+    revoked_ratio=0.05,
+    batch_size=10000,
+    progress=None,
+    seed=None,
+):
+    """
+    Inserts count fake users named prefix followed by a number, all with
+    password_hash, each with tokens_per_user access and refresh tokens.
+    Numbering carries on after the highest one already taken, and with a
+    seed the token jtis derive from it and the username, so that reruns
+    add new rows instead of colliding with the previous ones.
+
+    About expired_ratio of the tokens expired within their lifetime
+    (JWT_ACCESS_TOKEN_EXPIRES or JWT_REFRESH_TOKEN_EXPIRES) before now,
+    the others expire within their lifetime from now, and about
+    revoked_ratio of them are revoked. Rows go in with one batched
+    INSERT per about batch_size rows and one commit per batch. progress, if
+    given, is called with (users, tokens) after every batch. Returns
+    (users, tokens).
+    """
+    rng = random.Random(seed)
+    # Tokens that never expire get the default lifetimes.
+    lifetimes = {
+        "access": jwt_config.access_expires or timedelta(minutes=15),
+        "refresh": jwt_config.refresh_expires or timedelta(days=30),
+    }
+    lifetimes = {
+        token_type: lifetime.total_seconds()
+        for token_type, lifetime in lifetimes.items()
+    }
+
+    start = _next_forged_number(prefix)
+    now = datetime.now()
+    user_table, token_table = UserModel.__table__, TokenModel.__table__
+    per_user = tokens_per_user + 1
+    users_done = tokens_done = 0
+    while users_done < count:
+        size = min(count - users_done, max(1, batch_size // per_user))
+        usernames = [
+            "{}{}".format(prefix, start + users_done + i) for i in range(size)
+        ]
+        tokens = []
+        for username in usernames:
+            for i in range(tokens_per_user):
+                token_type = "refresh" if i % 2 else "access"
+                offset = rng.uniform(0, lifetimes[token_type])
+                if rng.random() < expired_ratio:
+                    offset = -offset
+                if seed is None:
+                    jti = uuid.uuid4()
+                else:
+                    jti = uuid.uuid5(
+                        uuid.NAMESPACE_OID,
+                        "{}:{}:{}".format(seed, username, i),
+                    )
+                tokens.append(
+                    {
+                        "jti": str(jti),
+                        "token_type": token_type,
+                        "user_identity": username,
+                        "revoked": rng.random() < revoked_ratio,
+                        "expires": now + timedelta(seconds=offset),
+                    }
+                )
+        db.session.execute(
+            user_table.insert(),
+            [
+                {
+                    "username": username,
+                    "password_hash": password_hash,
+                    "member_since": now,
+                    "confirmed": True,
+                    "locked": False,
+                    "active": True,
+                }
+                for username in usernames
+            ],
+        )
+        if tokens:
+            db.session.execute(token_table.insert(), tokens)
+        db.session.commit()
+        users_done += size
+        tokens_done += len(tokens)
+        if progress is not None:
+            progress(users_done, tokens_done)
+    return users_done, tokens_done
@@ -0,0 +1,94 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class TTLCache(object):
+    """
+    A bounded, thread safe, in-process key -> value cache.
+
+    Entries expire at the epoch given along with them, capped by ``ttl``
+    seconds when set (or after ``ttl`` seconds when no expiry is given),
+    and the least recently used entries are evicted once ``maxsize`` is
+    reached.
+    """
+
+    def __init__(self, maxsize=10000, ttl=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _expires_at(self, exp):
+        now = time.time()
+        if exp is None:
+            exp = now + (self.ttl or 0)
+        elif self.ttl:
+            exp = min(exp, now + self.ttl)
+        return exp
+
+    def get(self, key):
+        """
+        Returns the cached value of a key, or None when unknown.
+        """
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                value, expires_at = entry
+                if expires_at > time.time():
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+            self.misses += 1
+            return None
+
+    def _store(self, key, value, expires_at):
+        # Called with the lock held.
+        if expires_at <= time.time():
+            self._data.pop(key, None)
+            return
+        self._data[key] = (value, expires_at)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def set(self, key, value, exp=None):
+        """
+        Stores the value of a key, replacing any cached one.
+        """
+        expires_at = self._expires_at(exp)
+        with self._lock:
+            self._store(key, value, expires_at)
+
+    def add(self, key, value, exp=None):
+        """
+        Stores the value of a key unless it is already cached. Used when
+        filling the cache from a slower source, so that a value read there
+        before a concurrent write can't overwrite the newer one.
+        """
+        expires_at = self._expires_at(exp)
+        with self._lock:
+            if key not in self._data:
+                self._store(key, value, expires_at)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+            }
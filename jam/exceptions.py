@@ -4,3 +4,31 @@ class TokenNotFound(Exception):
     """
 
     pass
+
+
+class HashingOverloaded(Exception):
+    """
+    Indicates that too many password hashing jobs are already pending
+    """
+
+    pass
+
+
+class LoginThrottled(Exception):
+    """
+    Indicates that too many logins were attempted for a username or from a
+    client, retry_after seconds before the next attempt may go through
+    """
+
+    def __init__(self, retry_after):
+        super(LoginThrottled, self).__init__(retry_after)
+        self.retry_after = retry_after
+
+
+class QueryBudgetExceeded(AssertionError):
+    """
+    Indicates that a request ran more SQL statements than its QUERY_BUDGETS
+    entry allows
+    """
+
+    pass
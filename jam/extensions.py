@@ -3,8 +3,21 @@ from flask_sqlalchemy import SQLAlchemy
 from flask_jwt_extended import JWTManager
 from flask_migrate import Migrate
 
+from jam.hashing import PasswordHasher
+from jam.keys import SigningKeys
+from jam.metrics import Metrics
+from jam.queries import QueryTracker
+from jam.revocation import Revocation
+from jam.throttle import LoginThrottle
+
 
 db = SQLAlchemy()
 jwt = JWTManager()
 # mail = Mail()
 migrate = Migrate()
+revocation = Revocation()
+password_hasher = PasswordHasher()
+signing_keys = SigningKeys()
+login_throttle = LoginThrottle()
+metrics = Metrics()
+query_tracker = QueryTracker()
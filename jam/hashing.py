@@ -0,0 +1,151 @@
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from flask import current_app
+from werkzeug.security import (
+    DEFAULT_PBKDF2_ITERATIONS,
+    check_password_hash,
+    generate_password_hash,
+)
+
+from jam.exceptions import HashingOverloaded
+from jam.metrics import timed
+
+
+def normalize_method(method):
+    """
+    Returns the method the way werkzeug writes it at the start of a hash,
+    e.g. "pbkdf2:sha256" becomes "pbkdf2:sha256:150000".
+    """
+    if method.startswith("pbkdf2:") and method.count(":") == 1:
+        return "{}:{}".format(method, DEFAULT_PBKDF2_ITERATIONS)
+    return method
+
+
+def time_method(method, rounds=5):
+    """
+    Returns the median time, in seconds, one hash takes with the given
+    method on this machine.
+    """
+    samples = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        generate_password_hash("correct horse battery staple", method)
+        samples.append(time.perf_counter() - start)
+    return sorted(samples)[len(samples) // 2]
+
+
+def _gevent_patched():
+    try:
+        from gevent import monkey
+    except ImportError:
+        return False
+    return monkey.is_module_patched("threading")
+
+
+class WorkerPool(object):
+    """
+    A bounded pool running CPU heavy calls away from the request handler.
+
+    Under the gevent worker class threading is monkey patched, so a thread
+    pool is backed by gevent's native thread pool and a waiting request only
+    blocks its own greenlet. No more than ``queue_limit`` calls may be
+    running or queued at once, further calls raise HashingOverloaded.
+    """
+
+    def __init__(self, kind="thread", workers=4, queue_limit=64):
+        self.kind = kind
+        self.queue_limit = queue_limit
+        self.pending = 0
+        self._lock = threading.Lock()
+        if kind == "process":
+            self._executor = ProcessPoolExecutor(workers)
+        elif kind == "thread" and _gevent_patched():
+            from gevent.threadpool import ThreadPool
+
+            self._executor = ThreadPool(workers)
+        elif kind == "thread":
+            self._executor = ThreadPoolExecutor(workers)
+        else:
+            raise RuntimeError("Unknown worker pool {!r}".format(kind))
+
+    def run(self, fn, *args):
+        with self._lock:
+            if self.pending >= self.queue_limit:
+                raise HashingOverloaded(
+                    "{} password hashing jobs pending".format(self.pending)
+                )
+            self.pending += 1
+        try:
+            if hasattr(self._executor, "submit"):
+                return self._executor.submit(fn, *args).result()
+            return self._executor.spawn(fn, *args).get()
+        finally:
+            with self._lock:
+                self.pending -= 1
+
+
+class PasswordHasher(object):
+    """
+    Hashes and verifies passwords, in the pool selected by
+    PASSWORD_HASH_POOL ("thread" or "process") or inline when it is empty.
+
+    New hashes follow the policy set by PASSWORD_HASH_METHOD (any method
+    werkzeug understands, e.g. "pbkdf2:sha256:150000") and
+    PASSWORD_SALT_LENGTH.
+    """
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault("PASSWORD_HASH_POOL", "")
+        app.config.setdefault("PASSWORD_HASH_WORKERS", 4)
+        app.config.setdefault("PASSWORD_HASH_QUEUE_LIMIT", 64)
+        app.config.setdefault("PASSWORD_HASH_METHOD", "pbkdf2:sha256")
+        app.config.setdefault("PASSWORD_SALT_LENGTH", 8)
+
+        pool = None
+        if app.config["PASSWORD_HASH_POOL"]:
+            pool = WorkerPool(
+                app.config["PASSWORD_HASH_POOL"],
+                workers=app.config["PASSWORD_HASH_WORKERS"],
+                queue_limit=app.config["PASSWORD_HASH_QUEUE_LIMIT"],
+            )
+        app.extensions["password_hasher"] = pool
+
+    @property
+    def pool(self):
+        return current_app.extensions.get("password_hasher")
+
+    def _run(self, fn, *args):
+        pool = self.pool
+        if pool is None:
+            return fn(*args)
+        return pool.run(fn, *args)
+
+    def generate(self, password):
+        with timed("password_hash_seconds", operation="generate"):
+            return self._run(
+                generate_password_hash,
+                password,
+                current_app.config["PASSWORD_HASH_METHOD"],
+                current_app.config["PASSWORD_SALT_LENGTH"],
+            )
+
+    def check(self, pwhash, password):
+        with timed("password_hash_seconds", operation="check"):
+            return self._run(check_password_hash, pwhash, password)
+
+    def needs_rehash(self, pwhash):
+        """
+        Tells whether a hash was made with another method, cost or salt
+        length than the current policy.
+        """
+        method, _, rest = pwhash.partition("$")
+        salt = rest.partition("$")[0]
+        return method != normalize_method(
+            current_app.config["PASSWORD_HASH_METHOD"]
+        ) or len(salt) != current_app.config["PASSWORD_SALT_LENGTH"]
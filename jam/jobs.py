@@ -0,0 +1,46 @@
+import threading
+
+from jam.extensions import db
+from jam.models import JobModel
+
+
+def start_job(app, name, fn, *args):
+    """
+    Runs fn(*args, progress=...) in the background and returns its
+    JobModel. The job row is what clients poll, so its status can be read
+    from any worker: "pending", "running", then "done" with fn's return
+    value as result, or "failed" with the error.
+    Like the token pruner, the job is a plain thread, which becomes a
+    greenlet under the gevent worker class.
+    """
+    job = JobModel(name=name)
+    job.save_to_db()
+    thread = threading.Thread(
+        target=_run_job, args=(app, job.id, fn, args), daemon=True
+    )
+    thread.start()
+    return job
+
+
+def _run_job(app, job_id, fn, args):
+    with app.app_context():
+        try:
+            job = JobModel.find_by_id(job_id)
+            job.status = "running"
+            job.save_to_db()
+
+            def progress(done):
+                job.progress = done
+                job.save_to_db()
+
+            try:
+                job.result = str(fn(*args, progress=progress))
+                job.status = "done"
+            except Exception as e:
+                db.session.rollback()
+                app.logger.exception("Job %s failed", job_id)
+                job.result = str(e)
+                job.status = "failed"
+            job.save_to_db()
+        finally:
+            db.session.remove()
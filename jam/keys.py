@@ -0,0 +1,189 @@
+import os
+import time
+
+from flask import current_app
+from flask_jwt_extended.config import config
+from jwt.exceptions import InvalidTokenError
+from jwt.utils import to_base64url_uint
+
+PRIVATE_SUFFIX = ".pem"
+PUBLIC_SUFFIX = ".pub.pem"
+
+
+def is_asymmetric(algorithm):
+    return algorithm[:2] in ("RS", "ES", "PS")
+
+
+def generate_private_key(algorithm):
+    """
+    Returns a new private key for algorithm, "RS256" or "ES256".
+    """
+    from cryptography.hazmat.backends import default_backend
+    from cryptography.hazmat.primitives.asymmetric import ec, rsa
+
+    if algorithm.startswith(("RS", "PS")):
+        return rsa.generate_private_key(65537, 2048, default_backend())
+    if algorithm == "ES256":
+        return ec.generate_private_key(ec.SECP256R1(), default_backend())
+    raise RuntimeError("Can't generate keys for {!r}".format(algorithm))
+
+
+def write_private_key(keys_dir, kid, key):
+    """
+    Saves key as <kid>.pem in keys_dir, readable by the owner only.
+    """
+    from cryptography.hazmat.primitives import serialization
+
+    os.makedirs(keys_dir, exist_ok=True)
+    path = os.path.join(keys_dir, kid + PRIVATE_SUFFIX)
+    pem = key.private_bytes(
+        serialization.Encoding.PEM,
+        serialization.PrivateFormat.PKCS8,
+        serialization.NoEncryption(),
+    )
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    with os.fdopen(fd, "wb") as f:
+        f.write(pem)
+    return path
+
+
+def new_kid():
+    return time.strftime("%Y%m%d%H%M%S", time.gmtime())
+
+
+def load_keys(keys_dir):
+    """
+    Parses the keys of keys_dir, <kid>.pem private keys and <kid>.pub.pem
+    public keys of retired ones. Returns ({kid: private key},
+    {kid: public key}), every private key also having its public key.
+    """
+    from cryptography.hazmat.backends import default_backend
+    from cryptography.hazmat.primitives import serialization
+
+    private, public = {}, {}
+    if not os.path.isdir(keys_dir):
+        return private, public
+    for name in sorted(os.listdir(keys_dir)):
+        with open(os.path.join(keys_dir, name), "rb") as f:
+            data = f.read()
+        if name.endswith(PUBLIC_SUFFIX):
+            kid = name[: -len(PUBLIC_SUFFIX)]
+            public[kid] = serialization.load_pem_public_key(
+                data, default_backend()
+            )
+        elif name.endswith(PRIVATE_SUFFIX):
+            kid = name[: -len(PRIVATE_SUFFIX)]
+            private[kid] = serialization.load_pem_private_key(
+                data, None, default_backend()
+            )
+            public[kid] = private[kid].public_key()
+    return private, public
+
+
+def public_jwk(kid, key, algorithm):
+    """
+    Returns the JWK (RFC 7517) of a RSA or EC public key.
+    """
+    numbers = key.public_numbers()
+    jwk = {"kid": kid, "use": "sig"}
+    if hasattr(key, "curve"):
+        jwk.update(
+            kty="EC",
+            alg="ES{}".format(key.curve.key_size),
+            crv="P-{}".format(key.curve.key_size),
+            x=to_base64url_uint(numbers.x).decode(),
+            y=to_base64url_uint(numbers.y).decode(),
+        )
+    else:
+        jwk.update(
+            kty="RSA",
+            alg=algorithm if algorithm[:2] in ("RS", "PS") else "RS256",
+            n=to_base64url_uint(numbers.n).decode(),
+            e=to_base64url_uint(numbers.e).decode(),
+        )
+    return jwk
+
+
+class SigningKeys(object):
+    """
+    Keys tokens are signed and verified with.
+
+    With a HS* JWT_ALGORITHM tokens are signed with the secret key, as
+    flask_jwt_extended does by default. With RS256 or ES256 they are signed
+    with the private key JWT_KEY_ID of JWT_KEYS_DIR (the last one in name
+    order when empty) and carry its ``kid`` in their header. Every key of
+    the directory is accepted for verification and published as JWKS, so
+    keys can be rotated by adding a new one, then retiring the old one to a
+    <kid>.pub.pem public key once the tokens it signed have expired.
+
+    Keys are parsed once, when the app is created.
+    """
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault("JWT_ALGORITHM", "HS256")
+        app.config.setdefault("JWT_KEYS_DIR", "keys")
+        app.config.setdefault("JWT_KEY_ID", "")
+        app.config.setdefault("JWKS_MAX_AGE", 300)
+
+        algorithm = app.config["JWT_ALGORITHM"]
+        if not is_asymmetric(algorithm):
+            app.extensions["signing_keys"] = None
+            return
+
+        private, public = load_keys(app.config["JWT_KEYS_DIR"])
+        kid = app.config["JWT_KEY_ID"] or max(private, default=None)
+        if kid not in private:
+            # Still let `flask genkey` create the first key.
+            app.logger.warning(
+                "No private key %r in %s, tokens can't be issued",
+                kid,
+                app.config["JWT_KEYS_DIR"],
+            )
+        app.extensions["signing_keys"] = {
+            "kid": kid,
+            "private": private.get(kid),
+            "public": public,
+            "jwks": {
+                "keys": [
+                    public_jwk(name, key, algorithm)
+                    for name, key in public.items()
+                ]
+            },
+        }
+
+    @property
+    def state(self):
+        return current_app.extensions.get("signing_keys")
+
+    def encode_key(self, identity):
+        state = self.state
+        if state is None:
+            return config.encode_key
+        if state["private"] is None:
+            raise RuntimeError("No private key to sign tokens with")
+        return state["private"]
+
+    def decode_key(self, claims, headers):
+        state = self.state
+        if state is None:
+            return config.decode_key
+        try:
+            return state["public"][headers.get("kid")]
+        except KeyError:
+            raise InvalidTokenError("Unknown key id")
+
+    def headers(self, identity):
+        state = self.state
+        if state is None:
+            return None
+        return {"kid": state["kid"]}
+
+    def jwks(self):
+        state = self.state
+        if state is None:
+            return {"keys": []}
+        return state["jwks"]
@@ -0,0 +1,149 @@
+import os
+import time
+from contextlib import contextmanager
+
+from flask import Response, current_app, g, has_app_context, request
+
+from jam.queries import request_queries
+
+# The collectors are process wide, they are created along with the first
+# app that enables metrics.
+_collectors = None
+
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89, float("inf"))
+
+
+def _create_collectors():
+    try:
+        from prometheus_client import Histogram
+    except ImportError:
+        return None
+
+    return {
+        "request_seconds": Histogram(
+            "jam_request_duration_seconds",
+            "Time spent handling requests",
+            ["endpoint", "method", "status"],
+        ),
+        "db_queries": Histogram(
+            "jam_request_db_queries",
+            "SQL statements run per request",
+            ["endpoint"],
+            buckets=QUERY_BUCKETS,
+        ),
+        "db_seconds": Histogram(
+            "jam_request_db_seconds",
+            "Time spent running SQL statements per request",
+            ["endpoint"],
+        ),
+        "password_hash_seconds": Histogram(
+            "jam_password_hash_seconds",
+            "Time spent hashing and checking passwords, queueing included",
+            ["operation"],
+        ),
+        "revocation_check_seconds": Histogram(
+            "jam_revocation_check_seconds",
+            "Time spent checking whether a token is revoked",
+            ["strategy"],
+        ),
+    }
+
+
+def _get_collectors():
+    global _collectors
+    if _collectors is None:
+        _collectors = _create_collectors()
+    return _collectors
+
+
+def _enabled():
+    return has_app_context() and bool(current_app.extensions.get("metrics"))
+
+
+@contextmanager
+def timed(name, **labels):
+    """
+    Observes the duration of the block in the histogram name, when the
+    current app records metrics.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        if _enabled():
+            _collectors[name].labels(**labels).observe(
+                time.perf_counter() - start
+            )
+
+
+class Metrics(object):
+    """
+    Records Prometheus metrics: latency, SQL statements and SQL time (as
+    counted by QueryTracker) of every request per endpoint, password hashing
+    time and revocation check time, exposed at METRICS_PATH.
+
+    Under gunicorn, point the prometheus_multiproc_dir environment variable
+    to an empty directory (see docker/docker-entrypoint.sh) so that a scrape
+    adds up every worker. Nothing is recorded when METRICS_ENABLED is False
+    or prometheus_client isn't installed.
+    """
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault("METRICS_ENABLED", True)
+        app.config.setdefault("METRICS_PATH", "/metrics")
+
+        collectors = None
+        if app.config["METRICS_ENABLED"]:
+            collectors = _get_collectors()
+            if collectors is None:
+                app.logger.warning(
+                    "prometheus_client is not installed, metrics are off"
+                )
+        app.extensions["metrics"] = collectors
+        if collectors is None:
+            return
+
+        app.before_request(self._start_request)
+        app.after_request(self._observe_request)
+        app.add_url_rule(app.config["METRICS_PATH"], "metrics", self.scrape)
+
+    @staticmethod
+    def _start_request():
+        g.jam_request_start = time.perf_counter()
+
+    @staticmethod
+    def _observe_request(response):
+        start = g.get("jam_request_start")
+        if start is None:
+            return response
+        endpoint = request.endpoint or "none"
+        _collectors["request_seconds"].labels(
+            endpoint, request.method, response.status_code
+        ).observe(time.perf_counter() - start)
+        queries, seconds = request_queries()
+        _collectors["db_queries"].labels(endpoint).observe(queries)
+        _collectors["db_seconds"].labels(endpoint).observe(seconds)
+        return response
+
+    @staticmethod
+    def scrape():
+        from prometheus_client import (
+            CONTENT_TYPE_LATEST,
+            REGISTRY,
+            CollectorRegistry,
+            generate_latest,
+        )
+
+        registry = REGISTRY
+        if "prometheus_multiproc_dir" in os.environ:
+            from prometheus_client import multiprocess
+
+            registry = CollectorRegistry()
+            multiprocess.MultiProcessCollector(registry)
+        return Response(
+            generate_latest(registry), mimetype=CONTENT_TYPE_LATEST
+        )
@@ -0,0 +1,38 @@
+"""index token user identity and id
+
+Revision ID: 2d8e5f3a7c61
+Revises: 9c2f7a1e6b48
+Create Date: 2026-10-18 13:40:55.912307
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "2d8e5f3a7c61"
+down_revision = "9c2f7a1e6b48"
+branch_labels = None
+depends_on = None
+
+
+def _existing_indexes():
+    inspector = sa.inspect(op.get_bind())
+    if "token" not in inspector.get_table_names():
+        return None
+    return {index["name"] for index in inspector.get_indexes("token")}
+
+
+def upgrade():
+    # Lets GET /api/auth/token page through a user's tokens by id.
+    existing = _existing_indexes()
+    if existing is not None and "ix_token_user_identity_id" not in existing:
+        op.create_index(
+            "ix_token_user_identity_id", "token", ["user_identity", "id"]
+        )
+
+
+def downgrade():
+    existing = _existing_indexes() or set()
+    if "ix_token_user_identity_id" in existing:
+        op.drop_index("ix_token_user_identity_id", table_name="token")
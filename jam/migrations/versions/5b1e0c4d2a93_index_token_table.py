@@ -0,0 +1,51 @@
+"""index token table
+
+Revision ID: 5b1e0c4d2a93
+Revises:
+Create Date: 2026-10-18 09:12:41.530214
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "5b1e0c4d2a93"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+INDEXES = [
+    ("ix_token_jti", ["jti"], True),
+    (
+        "ix_token_user_identity_revoked_expires",
+        ["user_identity", "revoked", "expires"],
+        False,
+    ),
+    ("ix_token_expires", ["expires"], False),
+]
+
+
+def _existing_indexes():
+    inspector = sa.inspect(op.get_bind())
+    if "token" not in inspector.get_table_names():
+        return None
+    return {index["name"] for index in inspector.get_indexes("token")}
+
+
+def upgrade():
+    existing = _existing_indexes()
+    if existing is None:
+        # `flask initdb` creates the table with its indexes already.
+        return
+    for name, columns, unique in INDEXES:
+        if name not in existing:
+            op.create_index(name, "token", columns, unique=unique)
+
+
+def downgrade():
+    existing = _existing_indexes() or set()
+    for name, _, _ in reversed(INDEXES):
+        if name in existing:
+            op.drop_index(name, table_name="token")
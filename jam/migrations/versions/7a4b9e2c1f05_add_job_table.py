@@ -0,0 +1,36 @@
+"""add job table
+
+Revision ID: 7a4b9e2c1f05
+Revises: 2d8e5f3a7c61
+Create Date: 2026-10-18 15:21:08.447190
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "7a4b9e2c1f05"
+down_revision = "2d8e5f3a7c61"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    if "job" in sa.inspect(op.get_bind()).get_table_names():
+        return
+    op.create_table(
+        "job",
+        sa.Column("id", sa.String(length=36), nullable=False),
+        sa.Column("name", sa.String(length=50), nullable=False),
+        sa.Column("status", sa.String(length=10), nullable=False),
+        sa.Column("progress", sa.Integer(), nullable=False),
+        sa.Column("result", sa.Text(), nullable=True),
+        sa.Column("created", sa.DateTime(), nullable=True),
+        sa.Column("updated", sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint("id"),
+    )
+
+
+def downgrade():
+    op.drop_table("job")
@@ -0,0 +1,43 @@
+"""widen password hash
+
+Revision ID: 9c2f7a1e6b48
+Revises: 5b1e0c4d2a93
+Create Date: 2026-10-18 11:02:17.204861
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "9c2f7a1e6b48"
+down_revision = "5b1e0c4d2a93"
+branch_labels = None
+depends_on = None
+
+
+def _has_user_table():
+    return "user" in sa.inspect(op.get_bind()).get_table_names()
+
+
+def upgrade():
+    # pbkdf2:sha512 hashes are 160 characters long.
+    if not _has_user_table():
+        return
+    with op.batch_alter_table("user") as batch_op:
+        batch_op.alter_column(
+            "password_hash",
+            existing_type=sa.String(length=128),
+            type_=sa.String(length=255),
+        )
+
+
+def downgrade():
+    if not _has_user_table():
+        return
+    with op.batch_alter_table("user") as batch_op:
+        batch_op.alter_column(
+            "password_hash",
+            existing_type=sa.String(length=255),
+            type_=sa.String(length=128),
+        )
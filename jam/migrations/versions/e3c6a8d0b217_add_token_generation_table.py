@@ -0,0 +1,31 @@
+"""add token generation table
+
+Revision ID: e3c6a8d0b217
+Revises: 7a4b9e2c1f05
+Create Date: 2026-10-18 16:48:32.019583
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "e3c6a8d0b217"
+down_revision = "7a4b9e2c1f05"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    if "token_generation" in sa.inspect(op.get_bind()).get_table_names():
+        return
+    op.create_table(
+        "token_generation",
+        sa.Column("user_identity", sa.String(length=50), nullable=False),
+        sa.Column("generation", sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint("user_identity"),
+    )
+
+
+def downgrade():
+    op.drop_table("token_generation")
@@ -1,2 +1,4 @@
 from .user import UserModel  # noqa
 from .token import TokenModel  # noqa
+from .job import JobModel  # noqa
+from .generation import TokenGenerationModel  # noqa
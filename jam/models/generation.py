@@ -0,0 +1,80 @@
+from flask import current_app
+from sqlalchemy.exc import IntegrityError
+
+from jam.extensions import db, revocation
+
+
+class TokenGenerationModel(db.Model):
+    """
+    Per user generation of tokens, used when REVOCATION_STRATEGY is
+    "generation". Tokens carry the generation they were issued in, and
+    bumping it revokes all of them at once.
+
+    A bump leaves the token rows alone: their revoked flag, which token
+    listings and filters such as active_only read, only reflects individual
+    revokes. Verification and introspection check the generation too.
+    """
+
+    __tablename__ = "token_generation"
+
+    user_identity = db.Column(db.String(50), primary_key=True)
+    generation = db.Column(db.Integer, nullable=False, default=0)
+
+    @classmethod
+    def get_generation(cls, user_identity, cached=True):
+        """
+        Returns the current generation of a user, 0 for users who never
+        bumped it. The answer is cached per worker for GENERATION_CACHE_TTL
+        seconds, which is fine for checking tokens. Minting passes
+        cached=False: a token minted with a stale generation would work
+        until the cache caught up with the bump, then be refused.
+        """
+        generation = None
+        if cached:
+            generation = revocation.get_generation(user_identity)
+        if generation is None:
+            generation = (
+                db.session.query(cls.generation)
+                .filter_by(user_identity=user_identity)
+                .scalar()
+                or 0
+            )
+            if cached:
+                revocation.add_generation(user_identity, generation)
+        return generation
+
+    @classmethod
+    def bump(cls, user_identity):
+        """
+        Revokes every token issued to the user so far, whatever their
+        number, with one UPDATE (or INSERT for the first bump).
+        Returns the new generation.
+        """
+        query = cls.query.filter_by(user_identity=user_identity)
+        for _ in range(2):
+            if query.update(
+                {"generation": cls.generation + 1}, synchronize_session=False
+            ):
+                db.session.commit()
+                break
+            db.session.add(cls(user_identity=user_identity, generation=1))
+            try:
+                db.session.commit()
+                break
+            except IntegrityError:
+                # Somebody else inserted it first, bump their row instead.
+                db.session.rollback()
+        generation = query.with_entities(cls.generation).scalar()
+        revocation.set_generation(user_identity, generation)
+        return generation
+
+    @classmethod
+    def is_token_outdated(cls, decoded_token):
+        """
+        Tells whether a token was issued before the last bump of its user.
+        Tokens without a generation claim belong to generation 0.
+        """
+        config = current_app.config
+        user_claims = decoded_token.get(config["JWT_USER_CLAIMS"]) or {}
+        user_identity = decoded_token[config["JWT_IDENTITY_CLAIM"]]
+        return user_claims.get("gen", 0) < cls.get_generation(user_identity)
@@ -0,0 +1,39 @@
+import uuid
+from datetime import datetime
+
+from jam.extensions import db
+
+
+class JobModel(db.Model):
+    __tablename__ = "job"
+
+    id = db.Column(
+        db.String(36), primary_key=True, default=lambda: str(uuid.uuid4())
+    )
+    name = db.Column(db.String(50), nullable=False)
+    status = db.Column(db.String(10), nullable=False, default="pending")
+    progress = db.Column(db.Integer, nullable=False, default=0)
+    result = db.Column(db.Text)
+    created = db.Column(db.DateTime, default=datetime.utcnow)
+    updated = db.Column(
+        db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow
+    )
+
+    def to_dict(self):
+        return {
+            "job_id": self.id,
+            "name": self.name,
+            "status": self.status,
+            "progress": self.progress,
+            "result": self.result,
+            "created": self.created,
+            "updated": self.updated,
+        }
+
+    def save_to_db(self):
+        db.session.add(self)
+        db.session.commit()
+
+    @classmethod
+    def find_by_id(cls, job_id):
+        return cls.query.filter_by(id=job_id).first()
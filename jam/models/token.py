@@ -1,22 +1,32 @@
+import time
 from datetime import datetime
 
 from sqlalchemy.orm.exc import NoResultFound
 from flask_jwt_extended import decode_token
 
 from jam.exceptions import TokenNotFound
-from jam.extensions import db
+from jam.extensions import db, revocation
 from jam.utils import _epoch_utc_to_datetime
 
 
 class TokenModel(db.Model):
     __tablename__ = "token"
+    __table_args__ = (
+        db.Index(
+            "ix_token_user_identity_revoked_expires",
+            "user_identity",
+            "revoked",
+            "expires",
+        ),
+        db.Index("ix_token_user_identity_id", "user_identity", "id"),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
-    jti = db.Column(db.String(36), nullable=False)
+    jti = db.Column(db.String(36), nullable=False, unique=True, index=True)
     token_type = db.Column(db.String(10), nullable=False)
     user_identity = db.Column(db.String(50), nullable=False)
     revoked = db.Column(db.Boolean, nullable=False)
-    expires = db.Column(db.DateTime, nullable=False)
+    expires = db.Column(db.DateTime, nullable=False, index=True)
 
     def to_dict(self):
         return {
@@ -39,22 +49,43 @@ class TokenModel(db.Model):
         It is not revoked when it is added.
         :param identity_claim:
         """
-        decoded_token = decode_token(encoded_token)
-        jti = decoded_token["jti"]
-        token_type = decoded_token["type"]
-        user_identity = decoded_token[identity_claim]
-        expires = _epoch_utc_to_datetime(decoded_token["exp"])
-        revoked = False
-
-        db_token = cls(
-            jti=jti,
-            token_type=token_type,
-            user_identity=user_identity,
-            expires=expires,
-            revoked=revoked,
+        cls.save_decoded_token_to_db(
+            decode_token(encoded_token), identity_claim
         )
-        db.session.add(db_token)
+
+    @classmethod
+    def save_decoded_token_to_db(cls, decoded_token, identity_claim):
+        """
+        Adds a new token to the database from its claims, as returned by
+        :func:`jam.utils.mint_access_token` or ``decode_token``.
+        It is not revoked when it is added.
+        """
+        cls.save_decoded_tokens_to_db([decoded_token], identity_claim)
+
+    @classmethod
+    def save_decoded_tokens_to_db(cls, decoded_tokens, identity_claim):
+        """
+        Adds any number of new tokens to the database with a single INSERT
+        and a single commit, e.g. the access and refresh token of a login.
+        They are not revoked when they are added.
+        """
+        if not decoded_tokens:
+            return
+        revoked = False
+        rows = [
+            {
+                "jti": decoded_token["jti"],
+                "token_type": decoded_token["type"],
+                "user_identity": decoded_token[identity_claim],
+                "expires": _epoch_utc_to_datetime(decoded_token["exp"]),
+                "revoked": revoked,
+            }
+            for decoded_token in decoded_tokens
+        ]
+        db.session.execute(cls.__table__.insert().values(rows))
         db.session.commit()
+        for decoded_token in decoded_tokens:
+            revocation.set(decoded_token["jti"], revoked, decoded_token["exp"])
 
     @classmethod
     def is_token_revoked(cls, decoded_token):
@@ -63,13 +94,43 @@ class TokenModel(db.Model):
         the tokens that we create into this database, if the token is not
         present in the database we are going to consider it revoked, as we
         don't know where it was created.
+        The answer is cached per worker until the token expires.
         """
         jti = decoded_token.get("jti", None)
+        revoked = revocation.get(jti)
+        if revoked is not None:
+            return revoked
         try:
             token = cls.query.filter_by(jti=jti).one()
-            return token.revoked
+            revoked = token.revoked
         except NoResultFound:
-            return True
+            revoked = True
+        revocation.add(jti, revoked, decoded_token.get("exp"))
+        return revoked
+
+    @classmethod
+    def are_tokens_revoked(cls, decoded_tokens):
+        """
+        Like :meth:`is_token_revoked` for many tokens at once, the ones
+        missing from the cache are looked up with a single query.
+        Returns a list of flags, in the order of decoded_tokens.
+        """
+        jtis = [decoded_token.get("jti") for decoded_token in decoded_tokens]
+        flags = {jti: revocation.get(jti) for jti in jtis}
+        missing = {jti for jti, revoked in flags.items() if revoked is None}
+        if missing:
+            flags.update(
+                db.session.query(cls.jti, cls.revoked).filter(
+                    cls.jti.in_(list(missing))
+                )
+            )
+            for decoded_token in decoded_tokens:
+                jti = decoded_token.get("jti")
+                if flags[jti] is None:
+                    flags[jti] = True
+                if jti in missing:
+                    revocation.add(jti, flags[jti], decoded_token.get("exp"))
+        return [flags[jti] for jti in jtis]
 
     @classmethod
     def get_user_tokens(cls, user_identity):
@@ -77,54 +138,214 @@ class TokenModel(db.Model):
         Returns all of the tokens, revoked and unrevoked, that are stored for
         the given user
         """
-        return cls.query.filter_by(user_identity=user_identity).all()
+        return (
+            cls.query.filter_by(user_identity=user_identity)
+            .order_by(cls.id)
+            .all()
+        )
 
     @classmethod
-    def revoke_token(cls, token_id=None, user=None, jti=None):
+    def _filter_user_tokens(
+        cls,
+        query,
+        user_identity,
+        token_type=None,
+        revoked=None,
+        active_only=False,
+    ):
+        query = query.filter(cls.user_identity == user_identity)
+        if token_type is not None:
+            query = query.filter(cls.token_type == token_type)
+        if revoked is not None:
+            query = query.filter(cls.revoked == revoked)
+        if active_only:
+            query = query.filter(
+                cls.revoked.is_(False), cls.expires > datetime.now()
+            )
+        return query
+
+    @classmethod
+    def page_user_tokens(cls, user_identity, limit, cursor=None, **filters):
         """
-        Revokes the given token. Raises a TokenNotFound error if the token does
-        not exist in the database
+        Returns up to limit tokens of the given user as dicts, ordered by id
+        and starting after the id given as cursor, along with the cursor of
+        the next page (None on the last page).
+        filters are token_type, revoked and active_only (unrevoked and not
+        expired yet).
         """
-        try:
-            if jti:
-                token = cls.query.filter_by(jti=jti).one()
-            else:
-                token = cls.query.filter_by(
-                    id=token_id, user_identity=user
-                ).one()
-            token.revoked = True
-            db.session.commit()
-        except NoResultFound:
-            raise TokenNotFound("Could not find the token {}".format(token_id))
+        query = cls._filter_user_tokens(
+            db.session.query(
+                cls.id,
+                cls.jti,
+                cls.token_type,
+                cls.user_identity,
+                cls.revoked,
+                cls.expires,
+            ),
+            user_identity,
+            **filters
+        )
+        if cursor is not None:
+            query = query.filter(cls.id > cursor)
+        rows = query.order_by(cls.id).limit(limit + 1).all()
+        next_cursor = rows[limit - 1].id if len(rows) > limit else None
+        tokens = [
+            {
+                "token_id": row.id,
+                "jti": row.jti,
+                "token_type": row.token_type,
+                "user_identity": row.user_identity,
+                "revoked": row.revoked,
+                "expires": row.expires,
+            }
+            for row in rows[:limit]
+        ]
+        return tokens, next_cursor
 
     @classmethod
-    def unrevoke_token(cls, token_id=None, user=None, jti=None):
+    def count_user_tokens(cls, user_identity, **filters):
         """
-        Unrevokes the given token. Raises a TokenNotFound error if the token
-        does not exist in the database
+        Counts the tokens of the given user, see :meth:`page_user_tokens`
+        for the filters. Without a token_type filter the count is answered
+        from the (user_identity, revoked, expires) index.
         """
-        try:
-            if jti:
-                token = cls.query.filter_by(jti=jti).one()
-            else:
-                token = cls.query.filter_by(
-                    id=token_id, user_identity=user
-                ).one()
-            token.revoked = False
+        query = cls._filter_user_tokens(
+            db.session.query(db.func.count(cls.id)), user_identity, **filters
+        )
+        return query.scalar()
+
+    @classmethod
+    def delete_user_tokens(cls, user_identities):
+        """
+        Deletes every token of the given users. Doesn't commit, letting the
+        caller delete the users in the same transaction.
+        Returns the (jti, expires) pairs of the deleted tokens when the
+        revocation state is tracked, for the caller to mark them revoked
+        with ``revocation.set_many`` once the transaction is committed:
+        clearing the state before would let a concurrent check cache the
+        rows it still sees as not revoked.
+        """
+        query = cls.query.filter(cls.user_identity.in_(user_identities))
+        deleted = []
+        if revocation.enabled:
+            deleted = query.with_entities(cls.jti, cls.expires).all()
+        query.delete(synchronize_session=False)
+        return deleted
+
+    @classmethod
+    def revoke_tokens(
+        cls, user_identity, token_ids=None, revoke=True, chunk_size=500
+    ):
+        """
+        Revokes (or unrevokes) the given tokens of a user, or all of them
+        when token_ids is None. Returns the number of matched tokens.
+        Without revocation state to keep up to date this is a single UPDATE.
+        Otherwise the matching rows are read first and exactly those are
+        updated, by id and chunk_size at a time, so that a token issued
+        meanwhile can't end up revoked in the database but not in the cache.
+        """
+        query = cls.query.filter(cls.user_identity == user_identity)
+        if token_ids is not None:
+            query = query.filter(cls.id.in_(token_ids))
+        if not revocation.enabled:
+            count = query.update(
+                {"revoked": revoke}, synchronize_session=False
+            )
             db.session.commit()
-        except NoResultFound:
-            raise TokenNotFound("Could not find the token {}".format(token_id))
+            return count
+
+        changed = query.with_entities(cls.id, cls.jti, cls.expires).all()
+        for start in range(0, len(changed), chunk_size):
+            end = start + chunk_size
+            ids = [row.id for row in changed[start:end]]
+            cls.query.filter(cls.id.in_(ids)).update(
+                {"revoked": revoke}, synchronize_session=False
+            )
+        db.session.commit()
+        revocation.set_many(
+            (row.jti, revoke, row.expires) for row in changed
+        )
+        return len(changed)
 
     @classmethod
-    def prune_database_tokens(cls):
+    def _set_revoked(
+        cls, revoked, token_id=None, user=None, jti=None, exp=None
+    ):
+        if jti:
+            query = cls.query.filter_by(jti=jti)
+        else:
+            query = cls.query.filter_by(id=token_id, user_identity=user)
+        count = query.update({"revoked": revoked}, synchronize_session=False)
+        db.session.commit()
+        if not count:
+            raise TokenNotFound(
+                "Could not find the token {}".format(token_id or jti)
+            )
+        if not revocation.enabled:
+            return
+        if jti is None or exp is None:
+            # The shared store only keeps entries with an expiry, without
+            # one a stale add() could fill the key back with "not revoked".
+            jti, exp = query.with_entities(cls.jti, cls.expires).one()
+        revocation.set(jti, revoked, exp)
+
+    @classmethod
+    def revoke_token(cls, token_id=None, user=None, jti=None, exp=None):
+        """
+        Revokes the given token with a single conditional UPDATE. Raises a
+        TokenNotFound error if the token does not exist in the database.
+        Passing the token's exp along with its jti spares reading it back.
+        """
+        cls._set_revoked(True, token_id, user, jti, exp)
+
+    @classmethod
+    def unrevoke_token(cls, token_id=None, user=None, jti=None, exp=None):
+        """
+        Unrevokes the given token with a single conditional UPDATE. Raises a
+        TokenNotFound error if the token does not exist in the database.
+        Passing the token's exp along with its jti spares reading it back.
+        """
+        cls._set_revoked(False, token_id, user, jti, exp)
+
+    @classmethod
+    def prune_database_tokens(
+        cls, batch_size=1000, pause=0, dry_run=False, progress=None
+    ):
         """
         Delete tokens that have expired from the database.
         How (and if) you call this is entirely up you. You could expose it to
         an endpoint that only administrators could call, you could run it as
         a cron, set it up with flask cli, etc.
+        Rows are deleted batch_size at a time with a commit per batch, so
+        neither memory nor lock time grows with the number of expired tokens.
+        pause seconds are slept between batches, and progress, if given, is
+        called with the running total after every batch.
+        Returns the number of deleted rows, or with dry_run the number of rows
+        that would have been deleted.
         """
-        now = datetime.now()
-        expired = cls.query.filter(cls.expires < now).all()
-        for token in expired:
-            db.session.delete(token)
-        db.session.commit()
+        expired = cls.query.filter(cls.expires < datetime.now())
+        if dry_run:
+            return expired.count()
+
+        deleted = 0
+        while True:
+            ids = [
+                token_id
+                for token_id, in expired.with_entities(cls.id).limit(
+                    batch_size
+                )
+            ]
+            if not ids:
+                break
+            cls.query.filter(cls.id.in_(ids)).delete(
+                synchronize_session=False
+            )
+            db.session.commit()
+            deleted += len(ids)
+            if progress is not None:
+                progress(deleted)
+            if len(ids) < batch_size:
+                break
+            if pause:
+                time.sleep(pause)
+        return deleted
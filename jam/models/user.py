@@ -1,8 +1,7 @@
 from datetime import datetime
 
-from werkzeug.security import generate_password_hash, check_password_hash
-
-from jam.extensions import db
+from jam.extensions import db, password_hasher, revocation
+from jam.models.token import TokenModel
 
 
 class UserModel(db.Model):
@@ -11,7 +10,7 @@ class UserModel(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(20), unique=True, index=True)
     email = db.Column(db.String(254), unique=True, index=True)
-    password_hash = db.Column(db.String(128))
+    password_hash = db.Column(db.String(255))
     name = db.Column(db.String(30))
     member_since = db.Column(db.DateTime, default=datetime.utcnow)
 
@@ -26,10 +25,19 @@ class UserModel(db.Model):
         super(UserModel, self).__init__(**kwargs)
 
     def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = password_hasher.generate(password)
 
     def validate_password(self, password):
-        return check_password_hash(self.password_hash, password)
+        """
+        Checks the password, and re-hashes it when the stored hash doesn't
+        follow the current hashing policy anymore.
+        """
+        if not password_hasher.check(self.password_hash, password):
+            return False
+        if password_hasher.needs_rehash(self.password_hash):
+            self.set_password(password)
+            self.save_to_db()
+        return True
 
     def save_to_db(self):
         db.session.add(self)
@@ -40,19 +48,66 @@ class UserModel(db.Model):
         return cls.query.filter_by(username=username).first()
 
     @classmethod
-    def return_all(cls):
-        def to_json(x):
-            return {"username": x.username}
+    def return_page(cls, limit, cursor=None):
+        """
+        Returns up to limit users ordered by id, starting after the id given
+        as cursor, along with the cursor of the next page (None on the last
+        page). Only the needed columns are selected.
+        """
+        query = db.session.query(cls.id, cls.username).order_by(cls.id)
+        if cursor is not None:
+            query = query.filter(cls.id > cursor)
+        rows = query.limit(limit + 1).all()
+        next_cursor = rows[limit - 1].id if len(rows) > limit else None
+        return (
+            {"users": [{"username": row.username} for row in rows[:limit]]},
+            next_cursor,
+        )
 
-        return {
-            "users": list(map(lambda x: to_json(x), UserModel.query.all()))
-        }
+    @classmethod
+    def iter_all(cls, columns=("username",), chunk_size=1000):
+        """
+        Yields every user as a dict of the given columns, reading them from
+        a server side cursor chunk_size rows at a time.
+        """
+        query = (
+            db.session.query(*[getattr(cls, column) for column in columns])
+            .order_by(cls.id)
+            .execution_options(stream_results=True)
+            .yield_per(chunk_size)
+        )
+        for row in query:
+            yield dict(zip(columns, row))
 
     @classmethod
-    def delete_all(cls):
-        try:
-            num_rows_deleted = db.session.query(cls).delete()
+    def delete_all(cls, batch_size=1000, progress=None):
+        """
+        Deletes every user, batch_size at a time with a commit per batch,
+        together with their tokens. progress, if given, is called with the
+        running total after every batch.
+        Returns the number of deleted users.
+        """
+        deleted = 0
+        while True:
+            rows = (
+                db.session.query(cls.id, cls.username)
+                .order_by(cls.id)
+                .limit(batch_size)
+                .all()
+            )
+            if not rows:
+                break
+            tokens = TokenModel.delete_user_tokens(
+                [row.username for row in rows]
+            )
+            cls.query.filter(cls.id.in_([row.id for row in rows])).delete(
+                synchronize_session=False
+            )
             db.session.commit()
-            return {"message": "{} row(s) deleted".format(num_rows_deleted)}
-        except Exception:
-            return {"message": "Something went wrong"}
+            revocation.set_many(
+                (jti, True, expires) for jti, expires in tokens
+            )
+            deleted += len(rows)
+            if progress is not None:
+                progress(deleted)
+        return deleted
@@ -0,0 +1,106 @@
+import time
+
+from flask import current_app, g, has_app_context, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from jam.exceptions import QueryBudgetExceeded
+
+_installed = False
+
+
+def _install():
+    global _installed
+    if not _installed:
+        event.listen(Engine, "before_cursor_execute", _before_cursor)
+        event.listen(Engine, "after_cursor_execute", _after_cursor)
+        _installed = True
+
+
+def _endpoint():
+    if has_request_context():
+        return request.endpoint or "none"
+    return "-"
+
+
+def _before_cursor(conn, cursor, statement, parameters, context, many):
+    conn.info.setdefault("jam_query_start", []).append(time.perf_counter())
+
+
+def _after_cursor(conn, cursor, statement, parameters, context, many):
+    elapsed = time.perf_counter() - conn.info["jam_query_start"].pop()
+    if not has_app_context() or "query_tracker" not in current_app.extensions:
+        return
+    g.jam_db_queries = g.get("jam_db_queries", 0) + 1
+    g.jam_db_seconds = g.get("jam_db_seconds", 0.0) + elapsed
+    if "jam_db_statements" in g:
+        g.jam_db_statements.append(statement)
+
+    threshold = current_app.config["SLOW_QUERY_THRESHOLD"]
+    if threshold and elapsed >= threshold:
+        current_app.logger.warning(
+            "Slow query (%.3fs) in %s: %s", elapsed, _endpoint(), statement
+        )
+
+
+def request_queries():
+    """
+    Returns the number of SQL statements the current request has run so far,
+    and the seconds they took.
+    """
+    return g.get("jam_db_queries", 0), g.get("jam_db_seconds", 0.0)
+
+
+class QueryTracker(object):
+    """
+    Counts and times the SQL statements of every request, and logs the ones
+    taking SLOW_QUERY_THRESHOLD seconds or more (0 to never log them) with
+    the endpoint that ran them.
+
+    QUERY_BUDGETS maps endpoints, optionally prefixed with a method (e.g.
+    "GET api.auth_token_api"), to the most statements a request may run.
+    A request over its budget raises QueryBudgetExceeded, which the testing
+    config propagates to the test.
+    """
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault("SLOW_QUERY_THRESHOLD", 0.5)
+        app.config.setdefault("QUERY_BUDGETS", {})
+
+        _install()
+        app.extensions["query_tracker"] = self
+        app.before_request(self._start_request)
+        app.after_request(self._check_budget)
+
+    @staticmethod
+    def _start_request():
+        g.jam_db_queries = 0
+        g.jam_db_seconds = 0.0
+        if current_app.config["QUERY_BUDGETS"]:
+            g.jam_db_statements = []
+
+    @staticmethod
+    def _check_budget(response):
+        budgets = current_app.config["QUERY_BUDGETS"]
+        if not budgets:
+            return response
+        budget = budgets.get(
+            "{} {}".format(request.method, request.endpoint),
+            budgets.get(request.endpoint),
+        )
+        count, _ = request_queries()
+        if budget is not None and count > budget:
+            raise QueryBudgetExceeded(
+                "{} {} ran {} statements, the budget is {}:\n{}".format(
+                    request.method,
+                    request.endpoint,
+                    count,
+                    budget,
+                    "\n".join(g.get("jam_db_statements", [])),
+                )
+            )
+        return response
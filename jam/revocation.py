@@ -0,0 +1,246 @@
+import time
+from datetime import datetime
+
+from flask import current_app
+
+from jam.cache import TTLCache
+from jam.utils import _datetime_to_epoch
+
+
+class RevocationCache(TTLCache):
+    """
+    A :class:`~jam.cache.TTLCache` of jti -> revoked.
+
+    Entries expire at the token's own ``exp`` (capped by ``ttl`` seconds, so
+    a revocation made by another worker is picked up eventually).
+    """
+
+
+class RedisRevocationStore(object):
+    """
+    Keeps jti -> revoked in redis so that every worker and host shares the
+    same answer. Keys expire together with the token they describe.
+    """
+
+    def __init__(
+        self,
+        client,
+        prefix="jam:revoked:",
+        generation_prefix="jam:generation:",
+    ):
+        self.client = client
+        self.prefix = prefix
+        self.generation_prefix = generation_prefix
+
+    def _key(self, jti):
+        return self.prefix + jti
+
+    @staticmethod
+    def _ttl(exp):
+        if exp is None:
+            return None
+        return int(exp - time.time())
+
+    def get(self, jti):
+        value = self.client.get(self._key(jti))
+        if value is None:
+            return None
+        return value == b"1"
+
+    def set(self, jti, revoked, exp=None, nx=False):
+        ttl = self._ttl(exp)
+        if ttl is None or ttl <= 0:
+            # Without an expiry the key would live forever, let the database
+            # answer instead.
+            self.delete(jti)
+            return
+        self.client.set(
+            self._key(jti), b"1" if revoked else b"0", ex=ttl, nx=nx
+        )
+
+    def add(self, jti, revoked, exp=None):
+        ttl = self._ttl(exp)
+        if ttl is not None and ttl > 0:
+            self.set(jti, revoked, exp, nx=True)
+
+    def delete(self, jti):
+        self.client.delete(self._key(jti))
+
+    def set_many(self, items):
+        """
+        Stores (jti, revoked, exp) triples in a single round trip.
+        """
+        pipe = self.client.pipeline(transaction=False)
+        for jti, revoked, exp in items:
+            ttl = self._ttl(exp)
+            if ttl is None or ttl <= 0:
+                pipe.delete(self._key(jti))
+            else:
+                pipe.set(self._key(jti), b"1" if revoked else b"0", ex=ttl)
+        pipe.execute()
+
+    def get_generation(self, user_identity):
+        value = self.client.get(self.generation_prefix + user_identity)
+        return None if value is None else int(value)
+
+    def set_generation(self, user_identity, generation, nx=False):
+        self.client.set(
+            self.generation_prefix + user_identity, str(generation), nx=nx
+        )
+
+
+class Revocation(object):
+    """
+    Keeps track of token revocation state in front of the token table.
+
+    Lookups go through the per worker cache, then through the shared store
+    selected by REVOCATION_BACKEND ("sql" for none, or "redis"). When both
+    are disabled every call is a no-op and the callers fall back to the
+    database, which stays the record of every issued token.
+    """
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault("REVOCATION_CACHE_SIZE", 10000)
+        app.config.setdefault("REVOCATION_CACHE_TTL", 300)
+        app.config.setdefault("REVOCATION_BACKEND", "sql")
+        app.config.setdefault("REDIS_URL", "redis://localhost:6379/0")
+        app.config.setdefault("REVOCATION_STRATEGY", "jti")
+        app.config.setdefault("GENERATION_CACHE_TTL", 30)
+
+        cache = generations = None
+        if app.config["REVOCATION_CACHE_SIZE"]:
+            cache = RevocationCache(
+                maxsize=app.config["REVOCATION_CACHE_SIZE"],
+                ttl=app.config["REVOCATION_CACHE_TTL"],
+            )
+            generations = TTLCache(
+                maxsize=app.config["REVOCATION_CACHE_SIZE"],
+                ttl=app.config["GENERATION_CACHE_TTL"],
+            )
+
+        backend = app.config["REVOCATION_BACKEND"]
+        if backend == "sql":
+            store = None
+        elif backend == "redis":
+            store = RedisRevocationStore(get_redis(app))
+        else:
+            raise RuntimeError(
+                "Unknown REVOCATION_BACKEND {!r}".format(backend)
+            )
+        app.extensions["revocation"] = {
+            "cache": cache,
+            "generations": generations,
+            "store": store,
+        }
+
+    @property
+    def cache(self):
+        return current_app.extensions["revocation"]["cache"]
+
+    @property
+    def enabled(self):
+        state = current_app.extensions["revocation"]
+        return state["cache"] is not None or state["store"] is not None
+
+    @property
+    def store(self):
+        return current_app.extensions["revocation"]["store"]
+
+    def get(self, jti):
+        cache, store = self.cache, self.store
+        revoked = None
+        if cache is not None:
+            revoked = cache.get(jti)
+        if revoked is None and store is not None:
+            revoked = store.get(jti)
+            if revoked is not None and cache is not None:
+                cache.add(jti, revoked, time.time() + (cache.ttl or 0))
+        return revoked
+
+    def set(self, jti, revoked, exp=None):
+        exp = _to_epoch(exp)
+        if self.store is not None:
+            self.store.set(jti, revoked, exp)
+        if self.cache is not None:
+            self.cache.set(jti, revoked, exp)
+
+    def add(self, jti, revoked, exp=None):
+        exp = _to_epoch(exp)
+        if self.store is not None:
+            self.store.add(jti, revoked, exp)
+        if self.cache is not None:
+            self.cache.add(jti, revoked, exp)
+
+    def delete(self, jti):
+        if self.store is not None:
+            self.store.delete(jti)
+        if self.cache is not None:
+            self.cache.delete(jti)
+
+    def set_many(self, items):
+        """
+        Like :meth:`set` for many (jti, revoked, exp) triples at once.
+        """
+        items = [(jti, revoked, _to_epoch(exp)) for jti, revoked, exp in items]
+        if self.store is not None:
+            self.store.set_many(items)
+        if self.cache is not None:
+            for jti, revoked, exp in items:
+                self.cache.set(jti, revoked, exp)
+
+    @property
+    def generations(self):
+        return current_app.extensions["revocation"]["generations"]
+
+    def get_generation(self, user_identity):
+        generations, store = self.generations, self.store
+        generation = None
+        if generations is not None:
+            generation = generations.get(user_identity)
+        if generation is None and store is not None:
+            generation = store.get_generation(user_identity)
+            if generation is not None and generations is not None:
+                generations.add(user_identity, generation)
+        return generation
+
+    def set_generation(self, user_identity, generation):
+        if self.store is not None:
+            self.store.set_generation(user_identity, generation)
+        if self.generations is not None:
+            self.generations.set(user_identity, generation)
+
+    def add_generation(self, user_identity, generation):
+        if self.store is not None:
+            self.store.set_generation(user_identity, generation, nx=True)
+        if self.generations is not None:
+            self.generations.add(user_identity, generation)
+
+    def stats(self):
+        cache = self.cache
+        if cache is None:
+            return {}
+        return cache.stats()
+
+
+def get_redis(app):
+    """
+    Returns the redis client of the app, connecting to REDIS_URL the first
+    time it is needed.
+    """
+    client = app.extensions.get("redis")
+    if client is None:
+        from redis import StrictRedis
+
+        client = StrictRedis.from_url(app.config["REDIS_URL"])
+        app.extensions["redis"] = client
+    return client
+
+
+def _to_epoch(exp):
+    if isinstance(exp, datetime):
+        return _datetime_to_epoch(exp)
+    return exp
@@ -0,0 +1,98 @@
+import random
+import threading
+import zlib
+from contextlib import contextmanager
+
+from sqlalchemy import text
+
+from jam.extensions import db
+from jam.models import TokenModel
+
+
+@contextmanager
+def advisory_lock(name):
+    """
+    Holds a database wide named lock for the duration of the block and
+    yields whether it was acquired. Never waits for the lock.
+    MySQL/MariaDB and PostgreSQL use their advisory locks, sqlite only ever
+    runs on a single host and always gets the lock.
+    """
+    dialect = db.engine.dialect.name
+    if dialect == "mysql":
+        acquire = text("SELECT GET_LOCK(:name, 0)")
+        release = text("SELECT RELEASE_LOCK(:name)")
+        params = {"name": name}
+    elif dialect == "postgresql":
+        acquire = text("SELECT pg_try_advisory_lock(:key)")
+        release = text("SELECT pg_advisory_unlock(:key)")
+        params = {"key": zlib.crc32(name.encode())}
+    else:
+        yield True
+        return
+
+    # The lock belongs to this connection, keep it until we release it.
+    with db.engine.connect() as connection:
+        acquired = bool(connection.execute(acquire, params).scalar())
+        try:
+            yield acquired
+        finally:
+            if acquired:
+                connection.execute(release, params)
+
+
+class TokenPruner(object):
+    """
+    Prunes expired tokens in the background every TOKEN_PRUNE_INTERVAL
+    seconds, give or take TOKEN_PRUNE_JITTER (a fraction of the interval) so
+    that workers started together don't all wake up at once.
+    A database lock makes sure only one worker of the deployment prunes at a
+    time. Under gunicorn's gevent worker threading is monkey patched, so the
+    pruner runs as a greenlet and sleeps without blocking the worker.
+    """
+
+    lock_name = "jam.prunetoken"
+
+    def __init__(self, app):
+        self.app = app
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(
+            target=self._run, name="jam-token-pruner", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+
+    def next_delay(self):
+        interval = self.app.config["TOKEN_PRUNE_INTERVAL"]
+        jitter = self.app.config["TOKEN_PRUNE_JITTER"]
+        return interval * (1 + random.uniform(-jitter, jitter))
+
+    def _run(self):
+        while not self._stopped.wait(self.next_delay()):
+            try:
+                self.run_once()
+            except Exception:
+                self.app.logger.exception("Pruning expired tokens failed")
+
+    def run_once(self):
+        """
+        Prunes once if no other worker is pruning, returns the number of
+        deleted tokens or None when the lock was taken.
+        """
+        with self.app.app_context():
+            try:
+                with advisory_lock(self.lock_name) as acquired:
+                    if not acquired:
+                        return None
+                    deleted = TokenModel.prune_database_tokens(
+                        batch_size=self.app.config["PRUNE_BATCH_SIZE"],
+                        pause=self.app.config["PRUNE_PAUSE"],
+                    )
+                self.app.logger.info("Pruned %d expired token(s)", deleted)
+                return deleted
+            finally:
+                db.session.remove()
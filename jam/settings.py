@@ -17,7 +17,74 @@ class BaseConfig(object):
     JWT_ON = bool(os.getenv("JWT_ON", True))
     JWT_BLACKLIST_ENABLED = bool(os.getenv("JWT_BLACKLIST_ENABLED", True))
     JWT_BLACKLIST_TOKEN_CHECKS = ["access", "refresh"]
+    JWT_CLAIMS_IN_REFRESH_TOKEN = True
+    # "HS256" signs tokens with SECRET_KEY. "RS256" or "ES256" sign them with
+    # the private key JWT_KEY_ID (default the last one) of JWT_KEYS_DIR, see
+    # `flask genkey`, and publish every key of it at /api/auth/jwks.
+    JWT_ALGORITHM = os.getenv("JWT_ALGORITHM", "HS256")
+    JWT_KEYS_DIR = os.getenv("JWT_KEYS_DIR", os.path.join(basedir, "keys"))
+    JWT_KEY_ID = os.getenv("JWT_KEY_ID", "")
+    JWKS_MAX_AGE = int(os.getenv("JWKS_MAX_AGE", 300))
+    # Per worker cache of revoked flags, 0 to disable
+    REVOCATION_CACHE_SIZE = int(os.getenv("REVOCATION_CACHE_SIZE", 10000))
+    # Upper bound (seconds) on how long another worker's revoke can go unseen
+    REVOCATION_CACHE_TTL = int(os.getenv("REVOCATION_CACHE_TTL", 300))
+    # Shared revocation store: "sql" (token table only) or "redis"
+    REVOCATION_BACKEND = os.getenv("REVOCATION_BACKEND", "sql")
+    REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+    # "jti" checks every token against the token table. "generation" also
+    # embeds a per user generation in tokens, so that logging a user out
+    # everywhere is a single bump instead of revoking every token (whose
+    # rows then still read as not revoked in token listings).
+    REVOCATION_STRATEGY = os.getenv("REVOCATION_STRATEGY", "jti")
+    GENERATION_CACHE_TTL = int(os.getenv("GENERATION_CACHE_TTL", 30))
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    PAGE_SIZE = int(os.getenv("PAGE_SIZE", 100))
+    MAX_PAGE_SIZE = int(os.getenv("MAX_PAGE_SIZE", 1000))
+    # Tokens checked per call to /api/auth/token/introspect
+    INTROSPECT_MAX_TOKENS = int(os.getenv("INTROSPECT_MAX_TOKENS", 100))
+    # Users deleted per transaction by DELETE /api/users
+    DELETE_BATCH_SIZE = int(os.getenv("DELETE_BATCH_SIZE", 1000))
+    # Hash passwords in a "thread" or "process" pool, inline when empty
+    PASSWORD_HASH_POOL = os.getenv("PASSWORD_HASH_POOL", "")
+    PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", 4))
+    # Pending hashing jobs before logins are answered with 503
+    PASSWORD_HASH_QUEUE_LIMIT = int(os.getenv("PASSWORD_HASH_QUEUE_LIMIT", 64))
+    # Hashing policy, outdated hashes are upgraded on the next login.
+    # Use `flask hashbench` to pick the cost for your hardware.
+    PASSWORD_HASH_METHOD = os.getenv(
+        "PASSWORD_HASH_METHOD", "pbkdf2:sha256:150000"
+    )
+    PASSWORD_SALT_LENGTH = int(os.getenv("PASSWORD_SALT_LENGTH", 8))
+    # Logins and registrations let through per client IP, and failed logins
+    # per username, every LOGIN_THROTTLE_WINDOW seconds (0 for no limit),
+    # counted in the worker ("memory", the default) or in "redis", empty to
+    # turn throttling off
+    LOGIN_THROTTLE_BACKEND = os.getenv("LOGIN_THROTTLE_BACKEND", "memory")
+    LOGIN_THROTTLE_WINDOW = int(os.getenv("LOGIN_THROTTLE_WINDOW", 60))
+    LOGIN_THROTTLE_USERNAME_LIMIT = int(
+        os.getenv("LOGIN_THROTTLE_USERNAME_LIMIT", 10)
+    )
+    LOGIN_THROTTLE_IP_LIMIT = int(os.getenv("LOGIN_THROTTLE_IP_LIMIT", 100))
+    # Rows deleted per transaction when pruning expired tokens
+    PRUNE_BATCH_SIZE = int(os.getenv("PRUNE_BATCH_SIZE", 1000))
+    PRUNE_PAUSE = float(os.getenv("PRUNE_PAUSE", 0))
+    # Seconds between background prunes, 0 to leave it to `flask prunetoken`
+    TOKEN_PRUNE_INTERVAL = int(os.getenv("TOKEN_PRUNE_INTERVAL", 0))
+    TOKEN_PRUNE_JITTER = float(os.getenv("TOKEN_PRUNE_JITTER", 0.1))
+    # Prometheus metrics, scraped from METRICS_PATH
+    METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+    METRICS_PATH = os.getenv("METRICS_PATH", "/metrics")
+    # SQL statements taking longer (seconds) are logged, 0 to never log them
+    SLOW_QUERY_THRESHOLD = float(os.getenv("SLOW_QUERY_THRESHOLD", 0.5))
+    # Most SQL statements a request to an endpoint may run, see QueryTracker
+    QUERY_BUDGETS = {}
+    # With JWT_ON off, tokens minted for the "username" header are reused
+    # until INJECTED_TOKEN_MARGIN seconds before they expire
+    INJECTED_TOKEN_CACHE_SIZE = int(
+        os.getenv("INJECTED_TOKEN_CACHE_SIZE", 10000)
+    )
+    INJECTED_TOKEN_MARGIN = int(os.getenv("INJECTED_TOKEN_MARGIN", 60))
 
     @staticmethod
     def init_app(app):
@@ -0,0 +1,180 @@
+import math
+import threading
+import time
+from collections import OrderedDict
+
+from flask import current_app, request
+
+from jam.exceptions import LoginThrottled
+from jam.revocation import get_redis
+
+
+class SlidingWindowCounter(object):
+    """
+    Bounded, thread safe, in-process hit counters over a sliding window of
+    ``window`` seconds.
+
+    Each key keeps the count of the current and of the previous fixed
+    window, and the previous one is weighted by how much of it still
+    overlaps the sliding window. The least recently hit keys are evicted
+    once ``maxsize`` is reached.
+    """
+
+    def __init__(self, window=60, maxsize=100000):
+        self.window = window
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def hit(self, key, now=None):
+        """
+        Counts a hit on key. Returns the number of hits in the sliding
+        window, this one included, and the seconds left in the current
+        fixed window.
+        """
+        now = time.time() if now is None else now
+        index, elapsed = divmod(now, self.window)
+        index = int(index)
+        with self._lock:
+            last_index, current, previous = self._data.get(key, (index, 0, 0))
+            if last_index == index - 1:
+                current, previous = 0, current
+            elif last_index != index:
+                current, previous = 0, 0
+            current += 1
+            self._data[key] = (index, current, previous)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+        weight = 1 - elapsed / self.window
+        return previous * weight + current, self.window - elapsed
+
+    def peek(self, key, now=None):
+        """
+        Like :meth:`hit`, without counting a hit.
+        """
+        now = time.time() if now is None else now
+        index, elapsed = divmod(now, self.window)
+        index = int(index)
+        with self._lock:
+            last_index, current, previous = self._data.get(key, (index, 0, 0))
+        if last_index == index - 1:
+            current, previous = 0, current
+        elif last_index != index:
+            current, previous = 0, 0
+        weight = 1 - elapsed / self.window
+        return previous * weight + current, self.window - elapsed
+
+
+class RedisSlidingWindowCounter(object):
+    """
+    Like :class:`SlidingWindowCounter`, with the counts kept in redis so
+    that every worker and host shares them. A hit costs one round trip.
+    """
+
+    def __init__(self, client, window=60, prefix="jam:throttle:"):
+        self.client = client
+        self.window = window
+        self.prefix = prefix
+
+    def hit(self, key, now=None):
+        now = time.time() if now is None else now
+        index, elapsed = divmod(now, self.window)
+        index = int(index)
+        current_key = "{}{}:{}".format(self.prefix, key, index)
+        pipe = self.client.pipeline(transaction=False)
+        pipe.incr(current_key)
+        pipe.expire(current_key, int(self.window * 2))
+        pipe.get("{}{}:{}".format(self.prefix, key, index - 1))
+        current, _, previous = pipe.execute()
+        weight = 1 - elapsed / self.window
+        return int(previous or 0) * weight + current, self.window - elapsed
+
+    def peek(self, key, now=None):
+        now = time.time() if now is None else now
+        index, elapsed = divmod(now, self.window)
+        index = int(index)
+        current, previous = self.client.mget(
+            "{}{}:{}".format(self.prefix, key, index),
+            "{}{}:{}".format(self.prefix, key, index - 1),
+        )
+        weight = 1 - elapsed / self.window
+        count = int(previous or 0) * weight + int(current or 0)
+        return count, self.window - elapsed
+
+
+class LoginThrottle(object):
+    """
+    Limits the password checks per username and per client IP, so that a
+    credential stuffing burst is turned away before it reaches the database
+    and the password hashing.
+
+    Per LOGIN_THROTTLE_WINDOW seconds, a client IP gets at most
+    LOGIN_THROTTLE_IP_LIMIT attempts, and a username at most
+    LOGIN_THROTTLE_USERNAME_LIMIT failed ones, so that its legitimate
+    owner keeps logging in (0 for no limit). Counters live in the worker
+    ("memory", the default) or in redis ("redis") as selected by
+    LOGIN_THROTTLE_BACKEND, throttling is off while it is empty.
+    """
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault("LOGIN_THROTTLE_BACKEND", "memory")
+        app.config.setdefault("LOGIN_THROTTLE_WINDOW", 60)
+        app.config.setdefault("LOGIN_THROTTLE_USERNAME_LIMIT", 10)
+        app.config.setdefault("LOGIN_THROTTLE_IP_LIMIT", 100)
+        app.config.setdefault("LOGIN_THROTTLE_SIZE", 100000)
+
+        backend = app.config["LOGIN_THROTTLE_BACKEND"]
+        window = app.config["LOGIN_THROTTLE_WINDOW"]
+        if not backend:
+            counter = None
+        elif backend == "memory":
+            counter = SlidingWindowCounter(
+                window, maxsize=app.config["LOGIN_THROTTLE_SIZE"]
+            )
+        elif backend == "redis":
+            counter = RedisSlidingWindowCounter(get_redis(app), window)
+        else:
+            raise RuntimeError(
+                "Unknown LOGIN_THROTTLE_BACKEND {!r}".format(backend)
+            )
+        app.extensions["login_throttle"] = counter
+
+    @property
+    def counter(self):
+        return current_app.extensions.get("login_throttle")
+
+    def check(self, username):
+        """
+        Counts an attempt from the client of the request, and raises
+        LoginThrottled when it is over its limit, or when username already
+        failed too many times.
+        """
+        counter = self.counter
+        if counter is None:
+            return
+        config = current_app.config
+        limit = config["LOGIN_THROTTLE_IP_LIMIT"]
+        if limit:
+            count, reset = counter.hit("ip:{}".format(request.remote_addr))
+            if count > limit:
+                raise LoginThrottled(max(1, int(math.ceil(reset))))
+        limit = config["LOGIN_THROTTLE_USERNAME_LIMIT"]
+        if limit:
+            count, reset = counter.peek("user:{}".format(username))
+            if count >= limit:
+                raise LoginThrottled(max(1, int(math.ceil(reset))))
+
+    def failed(self, username):
+        """
+        Counts a failed attempt against username.
+        """
+        counter = self.counter
+        if counter is not None and current_app.config[
+            "LOGIN_THROTTLE_USERNAME_LIMIT"
+        ]:
+            counter.hit("user:{}".format(username))
@@ -1,13 +1,17 @@
-import os
-from datetime import datetime
+import time
+import uuid
+from calendar import timegm
+from datetime import datetime, timedelta
 from functools import wraps
 
+import jwt
+from flask import current_app, request, url_for
 from flask_jwt_extended import (
     verify_jwt_in_request,
     verify_jwt_refresh_token_in_request,
 )
-
-from jam.settings import conf
+from flask_jwt_extended.config import config
+from flask_jwt_extended.utils import _get_jwt_manager
 
 
 def _epoch_utc_to_datetime(epoch_utc):
@@ -18,9 +22,150 @@ def _epoch_utc_to_datetime(epoch_utc):
     return datetime.fromtimestamp(epoch_utc)
 
 
-def is_jwt_on():
-    config_name = os.getenv("FLASK_CONFIG", "development")
-    return conf[config_name].JWT_ON
+def _datetime_to_epoch(dt):
+    """
+    The inverse of :func:`_epoch_utc_to_datetime`, for turning the expires
+    column of a token back into an epoch timestamp.
+    """
+    return time.mktime(dt.timetuple())
+
+
+def _mint_token(identity, token_data, expires_delta):
+    jwt_manager = _get_jwt_manager()
+    now = datetime.utcnow()
+    claims = {"iat": now, "nbf": now, "jti": str(uuid.uuid4())}
+    if expires_delta:
+        claims["exp"] = now + expires_delta
+    claims.update(token_data)
+    if config.csrf_protect:
+        claims["csrf"] = str(uuid.uuid4())
+
+    encoded_token = jwt.encode(
+        claims,
+        jwt_manager._encode_key_callback(identity),
+        config.algorithm,
+        json_encoder=config.json_encoder,
+        headers=jwt_manager._jwt_additional_header_callback(identity),
+    ).decode("utf-8")
+
+    # Hand back the claims the way decode_token would return them.
+    for claim in ("iat", "nbf", "exp"):
+        if isinstance(claims.get(claim), datetime):
+            claims[claim] = timegm(claims[claim].utctimetuple())
+    claims.setdefault(config.user_claims_key, {})
+    return encoded_token, claims
+
+
+def mint_access_token(identity, fresh=False):
+    """
+    Works like :func:`~flask_jwt_extended.create_access_token`, but returns
+    the claims of the new token along with it, so that callers don't have
+    to decode (and verify) a token they have just signed.
+
+    :return: (encoded access token, claims)
+    """
+    jwt_manager = _get_jwt_manager()
+    if isinstance(fresh, timedelta):
+        fresh = timegm((datetime.utcnow() + fresh).utctimetuple())
+    token_data = {
+        config.identity_claim_key: jwt_manager._user_identity_callback(
+            identity
+        ),
+        "fresh": fresh,
+        "type": "access",
+    }
+    user_claims = jwt_manager._user_claims_callback(identity)
+    if user_claims:
+        token_data[config.user_claims_key] = user_claims
+    return _mint_token(identity, token_data, config.access_expires)
+
+
+def mint_refresh_token(identity):
+    """
+    Works like :func:`~flask_jwt_extended.create_refresh_token`, but returns
+    the claims of the new token along with it.
+
+    :return: (encoded refresh token, claims)
+    """
+    jwt_manager = _get_jwt_manager()
+    token_data = {
+        config.identity_claim_key: jwt_manager._user_identity_callback(
+            identity
+        ),
+        "type": "refresh",
+    }
+    if config.user_claims_in_refresh_token:
+        user_claims = jwt_manager._user_claims_callback(identity)
+        if user_claims:
+            token_data[config.user_claims_key] = user_claims
+    return _mint_token(identity, token_data, config.refresh_expires)
+
+
+def get_page_args():
+    """
+    Reads the ``limit`` and ``cursor`` query parameters of a paginated
+    listing. The limit defaults to PAGE_SIZE and is capped at MAX_PAGE_SIZE.
+    Raises ValueError when either of them isn't a positive integer.
+    """
+    limit = request.args.get("limit", current_app.config["PAGE_SIZE"])
+    cursor = request.args.get("cursor")
+    limit = int(limit)
+    if limit < 1:
+        raise ValueError("'limit' must be a positive integer")
+    if cursor is not None:
+        cursor = int(cursor)
+    return min(limit, current_app.config["MAX_PAGE_SIZE"]), cursor
+
+
+def next_page_headers(next_cursor):
+    """
+    Returns the Link header pointing at the next page of the current
+    listing, or no headers on the last page.
+    """
+    if next_cursor is None:
+        return {}
+    args = request.args.to_dict()
+    args["cursor"] = next_cursor
+    url = url_for(request.endpoint, _external=True, **args)
+    return {"Link": '<{}>; rel="next"'.format(url)}
+
+
+def wants_ndjson():
+    return (
+        request.args.get("format") == "ndjson"
+        or request.accept_mimetypes.best == "application/x-ndjson"
+    )
+
+
+def _skip_verification():
+    pass
+
+
+_VERIFIERS = {
+    True: {
+        "access": verify_jwt_in_request,
+        "refresh": verify_jwt_refresh_token_in_request,
+    },
+    False: {"access": _skip_verification, "refresh": _skip_verification},
+}
+
+
+def init_jwt_verifiers(app):
+    """
+    Resolves, once per app, what :func:`jwt_required` and
+    :func:`jwt_refresh_token_required` run before the view: the
+    flask_jwt_extended verification, or nothing when JWT_ON is False.
+    """
+    jwt_on = bool(app.config.get("JWT_ON", True))
+    verifiers = app.extensions["jwt_verifiers"] = _VERIFIERS[jwt_on]
+    return verifiers
+
+
+def _get_verifiers():
+    try:
+        return current_app.extensions["jwt_verifiers"]
+    except KeyError:
+        return init_jwt_verifiers(current_app)
 
 
 def jwt_required(fn):
@@ -32,13 +177,16 @@ def jwt_required(fn):
     has a valid access token before allowing the endpoint to be called. This
     does not check the freshness of the access token.
 
+    The bundled resources use flask_jwt_extended's own decorator instead:
+    with JWT_ON False they still need the identity of the token that
+    inject_jwt adds, which this one doesn't verify.
+
     See also: :func:`~flask_jwt_extended.fresh_jwt_required`
     """
 
     @wraps(fn)
     def wrapper(*args, **kwargs):
-        if is_jwt_on():
-            verify_jwt_in_request()
+        _get_verifiers()["access"]()
         return fn(*args, **kwargs)
 
     return wrapper
@@ -55,8 +203,7 @@ def jwt_refresh_token_required(fn):
 
     @wraps(fn)
     def wrapper(*args, **kwargs):
-        if is_jwt_on():
-            verify_jwt_refresh_token_in_request()
+        _get_verifiers()["refresh"]()
         return fn(*args, **kwargs)
 
     return wrapper
@@ -8,8 +8,11 @@ from jam.models import UserModel
 
 
 class BaseTestCase(unittest.TestCase):
+    def create_app(self):
+        return create_app("testing")
+
     def setUp(self):
-        app = create_app("testing")
+        app = self.create_app()
         self.context = app.test_request_context()
         self.context.push()
         self.client = app.test_client()
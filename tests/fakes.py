@@ -0,0 +1,88 @@
+import time
+
+
+class FakePipeline(object):
+    def __init__(self, client):
+        self._client = client
+        self._calls = []
+
+    def __getattr__(self, name):
+        method = getattr(self._client, name)
+
+        def queue(*args, **kwargs):
+            self._calls.append((method, args, kwargs))
+            return self
+
+        return queue
+
+    def execute(self):
+        calls, self._calls = self._calls, []
+        return [method(*args, **kwargs) for method, args, kwargs in calls]
+
+
+class FakeRedis(object):
+    """
+    A tiny in-memory stand-in for the parts of redis.StrictRedis jam uses.
+    """
+
+    def __init__(self):
+        self._data = {}
+
+    def _alive(self, name):
+        entry = self._data.get(name)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if expires_at is not None and expires_at <= time.time():
+            del self._data[name]
+            return None
+        return entry
+
+    def get(self, name):
+        entry = self._alive(name)
+        return None if entry is None else entry[0]
+
+    def mget(self, *names):
+        return [self.get(name) for name in names]
+
+    def set(self, name, value, ex=None, px=None, nx=False, xx=False):
+        exists = self._alive(name) is not None
+        if (nx and exists) or (xx and not exists):
+            return None
+        if isinstance(value, str):
+            value = value.encode()
+        expires_at = None
+        if ex is not None:
+            expires_at = time.time() + ex
+        elif px is not None:
+            expires_at = time.time() + px / 1000.0
+        self._data[name] = (value, expires_at)
+        return True
+
+    def incr(self, name, amount=1):
+        entry = self._alive(name)
+        value, expires_at = entry if entry is not None else (b"0", None)
+        value = int(value) + amount
+        self._data[name] = (str(value).encode(), expires_at)
+        return value
+
+    def expire(self, name, time_):
+        entry = self._alive(name)
+        if entry is None:
+            return False
+        self._data[name] = (entry[0], time.time() + time_)
+        return True
+
+    def delete(self, *names):
+        return sum(self._data.pop(name, None) is not None for name in names)
+
+    def ttl(self, name):
+        entry = self._alive(name)
+        if entry is None:
+            return -2
+        if entry[1] is None:
+            return -1
+        return int(entry[1] - time.time())
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
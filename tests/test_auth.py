@@ -1,9 +1,18 @@
-from flask import url_for
+import os
+import tempfile
+import threading
+from unittest import mock
+
+from flask import current_app, url_for
 from flask_jwt_extended import decode_token
 
-from jam.models import UserModel, TokenModel
+from jam import create_app
+from jam.extensions import db, login_throttle, password_hasher, revocation
+from jam.models import UserModel, TokenModel, TokenGenerationModel
+from jam.throttle import RedisSlidingWindowCounter, SlidingWindowCounter
 
 from .base import BaseTestCase
+from .fakes import FakeRedis
 
 
 class AuthTestCase(BaseTestCase):
@@ -37,6 +46,57 @@ class AuthTestCase(BaseTestCase):
         self.assertIn(access_token_jti, [x.jti for x in target_tokens])
         self.assertIn(refresh_token_jti, [x.jti for x in target_tokens])
 
+    def test_auth_token_list(self):
+        """
+        Page through the tokens, then filter them
+        """
+
+        self.login()
+        response = self.client.get(
+            url_for("api.auth_token_api", limit=3, count="true"),
+            headers=self._set_auth_headers(self.token_access),
+        )
+        self.assertEqual([1, 2, 3], [x["token_id"] for x in response.json])
+        self.assertEqual(response.headers["X-Total-Count"], "4")
+        self.assertIn("cursor=3", response.headers["Link"])
+
+        response = self.client.get(
+            url_for("api.auth_token_api", limit=3, cursor=3, count="true"),
+            headers=self._set_auth_headers(self.token_access),
+        )
+        self.assertEqual([4], [x["token_id"] for x in response.json])
+        self.assertNotIn("Link", response.headers)
+        self.assertNotIn("X-Total-Count", response.headers)
+
+        response = self.client.get(
+            url_for("api.auth_token_api", type="refresh", count=1),
+            headers=self._set_auth_headers(self.token_access),
+        )
+        self.assertEqual([2, 4], [x["token_id"] for x in response.json])
+        self.assertEqual(response.headers["X-Total-Count"], "2")
+
+    def test_auth_token_list_active_only(self):
+        TokenModel.revoke_token(jti=decode_token(self.token_refresh)["jti"])
+
+        response = self.client.get(
+            url_for("api.auth_token_api", active_only="true"),
+            headers=self._set_auth_headers(self.token_access),
+        )
+        self.assertEqual([1], [x["token_id"] for x in response.json])
+
+        response = self.client.get(
+            url_for("api.auth_token_api", revoked="true"),
+            headers=self._set_auth_headers(self.token_access),
+        )
+        self.assertEqual([2], [x["token_id"] for x in response.json])
+
+        response = self.client.get(
+            url_for("api.auth_token_api", revoked="maybe"),
+            headers=self._set_auth_headers(self.token_access),
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("'revoked'", response.json["msg"])
+
     def test_auth_token_refresh(self):
         """
         Refresh auth token first, then find that token
@@ -66,6 +126,41 @@ class AuthTestCase(BaseTestCase):
 
         self.assertTrue(target_tokens[1].revoked)
 
+    def test_auth_token_batch_revoke(self):
+        """
+        Revoke a list of tokens, then all the tokens of the user
+        """
+
+        self.login()
+        response = self.client.post(
+            url_for("api.auth_token_batch_revoke_api"),
+            json=dict(token_ids=[1, 3]),
+            headers=self._set_auth_headers(self.token_access),
+        )
+        self.assertEqual(response.json["msg"], "2 token(s) revoked")
+        target_tokens = TokenModel.get_user_tokens(self.username)
+        self.assertEqual(
+            [True, False, True, False], [x.revoked for x in target_tokens]
+        )
+
+        self.client.post(
+            url_for("api.auth_token_batch_revoke_api"),
+            json=dict(user_identity=self.username),
+            headers=self._set_auth_headers(self.token_access),
+        )
+        target_tokens = TokenModel.get_user_tokens(self.username)
+        self.assertTrue(all(x.revoked for x in target_tokens))
+        decoded = decode_token(self.token_refresh)
+        self.assertTrue(TokenModel.is_token_revoked(decoded))
+
+    def test_auth_token_batch_revoke_other_user(self):
+        response = self.client.post(
+            url_for("api.auth_token_batch_revoke_api"),
+            json=dict(user_identity="xyz"),
+            headers=self._set_auth_headers(self.token_access),
+        )
+        self.assertEqual(response.status_code, 403)
+
     def test_auth_logout_access(self):
         """
         Revoke access token first, then check accessibility
@@ -91,3 +186,246 @@ class AuthTestCase(BaseTestCase):
 
         target_tokens = TokenModel.get_user_tokens(self.username)
         self.assertTrue(target_tokens[1].revoked)
+
+    def test_auth_token_introspect(self):
+        """
+        Revoke the refresh token, then introspect it along with the access
+        token and garbage
+        """
+
+        self.logout_refresh(self.token_refresh)
+        revocation.cache.clear()
+
+        response = self.client.post(
+            url_for("api.auth_token_introspect_api"),
+            json=dict(
+                tokens=[self.token_access, self.token_refresh, "garbage"]
+            ),
+            headers=self._set_auth_headers(self.token_access),
+        )
+        self.assertEqual(response.status_code, 200)
+        access, refresh, garbage = response.get_json()["tokens"]
+        self.assertTrue(access["active"])
+        self.assertEqual(access["identity"], self.username)
+        self.assertEqual(access["type"], "access")
+        self.assertEqual(refresh, {"active": False})
+        self.assertEqual(garbage, {"active": False})
+        self.assertEqual(revocation.stats()["misses"], 2)
+
+        max_age = int(response.headers["Cache-Control"].split("=")[1])
+        self.assertLessEqual(
+            max_age, current_app.config["REVOCATION_CACHE_TTL"]
+        )
+        self.assertIn("Expires", response.headers)
+
+    def test_auth_token_introspect_invalid(self):
+        for tokens in (None, [], "x", ["x"] * 101):
+            response = self.client.post(
+                url_for("api.auth_token_introspect_api"),
+                json=dict(tokens=tokens),
+                headers=self._set_auth_headers(self.token_access),
+            )
+            self.assertEqual(response.status_code, 400)
+
+    def test_auth_token_rehash(self):
+        """
+        Change the hashing policy, then login upgrades the stored hash
+        """
+
+        current_app.config["PASSWORD_HASH_METHOD"] = "pbkdf2:sha256:1000"
+        self.login()
+
+        user = UserModel.find_by_username(self.username)
+        self.assertTrue(user.password_hash.startswith("pbkdf2:sha256:1000$"))
+        self.assertFalse(password_hasher.needs_rehash(user.password_hash))
+        self.assertEqual(self.login().status_code, 200)
+
+
+class HashingPoolTestCase(BaseTestCase):
+    def create_app(self):
+        app = create_app("testing")
+        app.config["PASSWORD_HASH_POOL"] = "thread"
+        password_hasher.init_app(app)
+        return app
+
+    def test_login_through_pool(self):
+        self.assertIsNotNone(current_app.extensions["password_hasher"])
+        self.assertEqual(self.login().status_code, 200)
+        self.assertEqual(self.login(password="456").status_code, 400)
+
+    def test_overloaded_pool(self):
+        password_hasher.pool.queue_limit = 0
+
+        response = self.login()
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.headers["Retry-After"], "1")
+
+
+class LoginThrottleTestCase(BaseTestCase):
+    def create_app(self):
+        app = create_app("testing")
+        app.config["LOGIN_THROTTLE_BACKEND"] = "memory"
+        app.config["LOGIN_THROTTLE_USERNAME_LIMIT"] = 3
+        app.config["LOGIN_THROTTLE_IP_LIMIT"] = 5
+        login_throttle.init_app(app)
+        return app
+
+    def test_username_limit(self):
+        """
+        After three wrong passwords even the right one is turned away
+        before it is checked
+        """
+
+        for _ in range(3):
+            self.assertEqual(self.login(password="456").status_code, 400)
+
+        with mock.patch.object(UserModel, "find_by_username") as find:
+            response = self.login()
+        self.assertEqual(response.status_code, 429)
+        self.assertGreaterEqual(int(response.headers["Retry-After"]), 1)
+        find.assert_not_called()
+
+    def test_successful_logins_not_counted(self):
+        for _ in range(3):
+            self.assertEqual(self.login().status_code, 200)
+        self.assertEqual(self.login(password="456").status_code, 400)
+
+    def test_ip_limit(self):
+        for username in ("u1", "u2", "u3", "u4"):
+            self.assertEqual(self.login(username=username).status_code, 400)
+        response = self.client.post(
+            url_for("api.auth_register_api"),
+            json=dict(username="u5", password=self.password),
+        )
+        self.assertEqual(response.status_code, 429)
+        self.assertIsNone(UserModel.find_by_username("u5"))
+
+    def test_sliding_window(self):
+        counter = SlidingWindowCounter(window=10)
+        for _ in range(4):
+            counter.hit("a", now=5)
+        self.assertEqual(counter.hit("a", now=9), (5, 1))
+        # Half of the previous window still overlaps the sliding window
+        self.assertEqual(counter.hit("a", now=15), (3.5, 5))
+        self.assertEqual(counter.hit("a", now=35), (1, 5))
+        self.assertEqual(counter.peek("a", now=35), (1, 5))
+        self.assertEqual(counter.peek("b", now=35), (0, 5))
+
+    def test_redis_counter(self):
+        counter = RedisSlidingWindowCounter(FakeRedis(), window=10)
+        for _ in range(4):
+            counter.hit("a", now=5)
+        self.assertEqual(counter.hit("a", now=9), (5, 1))
+        self.assertEqual(counter.hit("a", now=15), (3.5, 5))
+        self.assertEqual(counter.peek("a", now=15), (3.5, 5))
+        self.assertEqual(counter.hit("a", now=35), (1, 5))
+
+
+class GenerationRevocationTestCase(BaseTestCase):
+    def create_app(self):
+        app = create_app("testing")
+        app.config["JWT_BLACKLIST_ENABLED"] = True
+        app.config["REVOCATION_STRATEGY"] = "generation"
+        return app
+
+    def get_tokens(self, token):
+        return self.client.get(
+            url_for("api.auth_token_api"),
+            headers=self._set_auth_headers(token),
+        )
+
+    def test_generation_claim(self):
+        for token in (self.token_access, self.token_refresh):
+            self.assertEqual(decode_token(token)["user_claims"], {"gen": 0})
+
+    def test_log_out_everywhere(self):
+        """
+        Bump the generation, then old tokens are refused and new ones work
+        """
+
+        self.assertEqual(self.get_tokens(self.token_access).status_code, 200)
+
+        response = self.client.post(
+            url_for("api.auth_token_batch_revoke_api"),
+            json=dict(user_identity=self.username),
+            headers=self._set_auth_headers(self.token_access),
+        )
+        self.assertEqual(response.json["msg"], "All tokens revoked")
+        self.assertEqual(TokenGenerationModel.get_generation("abc"), 1)
+
+        self.assertEqual(self.get_tokens(self.token_access).status_code, 401)
+        response = self.client.post(
+            url_for("api.auth_token_refresh_api"),
+            headers=self._set_auth_headers(self.token_refresh),
+        )
+        self.assertEqual(response.status_code, 401)
+
+        token = self.login().get_json()["access_token"]
+        self.assertEqual(self.get_tokens(token).status_code, 200)
+
+    def test_new_tokens_ignore_stale_generation_cache(self):
+        """
+        A login on a worker whose cache missed the bump still gets a token
+        of the new generation
+        """
+
+        TokenGenerationModel.bump(self.username)
+        revocation.generations.set(self.username, 0)
+
+        token = self.login().get_json()["access_token"]
+        self.assertEqual(decode_token(token)["user_claims"], {"gen": 1})
+        revocation.generations.clear()
+        self.assertEqual(self.get_tokens(token).status_code, 200)
+
+    def test_individual_revoke_still_works(self):
+        self.logout_access(self.token_access)
+        self.assertEqual(self.get_tokens(self.token_access).status_code, 401)
+
+
+class ConcurrentLogoutTestCase(BaseTestCase):
+    def create_app(self):
+        # Threads need a database they can share, unlike sqlite's :memory:
+        fd, self.db_path = tempfile.mkstemp(suffix=".db")
+        os.close(fd)
+        app = create_app("testing")
+        app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///" + self.db_path
+        return app
+
+    def tearDown(self):
+        super(ConcurrentLogoutTestCase, self).tearDown()
+        os.remove(self.db_path)
+
+    def test_concurrent_logout(self):
+        """
+        Many threads log out the same and different tokens at once
+        """
+
+        tokens = [self.token_access] + [
+            self.login().get_json()["access_token"] for _ in range(3)
+        ]
+        url = url_for("api.auth_logout_access_api")
+        app = current_app._get_current_object()
+        db.session.remove()
+
+        statuses = []
+
+        def logout(token):
+            client = app.test_client()
+            for _ in range(5):
+                response = client.post(
+                    url, headers=self._set_auth_headers(token)
+                )
+                statuses.append(response.status_code)
+
+        threads = [
+            threading.Thread(target=logout, args=(token,))
+            for token in tokens * 4
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(statuses, [200] * 80)
+        access_tokens = TokenModel.get_user_tokens(self.username)[::2]
+        self.assertTrue(all(x.revoked for x in access_tokens))
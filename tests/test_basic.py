@@ -1,4 +1,8 @@
-from flask import current_app
+from flask import current_app, url_for
+from flask_jwt_extended.exceptions import NoAuthorizationError
+
+from jam import create_app
+from jam.utils import init_jwt_verifiers, jwt_required
 
 from .base import BaseTestCase
 
@@ -15,3 +19,50 @@ class BasicTestCase(BaseTestCase):
         data = response.get_data(as_text=True)
         self.assertEqual(response.status_code, 404)
         self.assertIn("404", data)
+
+    def test_jwt_required_off(self):
+        view = jwt_required(lambda: "ok")
+        self.assertEqual(view(), "ok")
+
+    def test_jwt_required_on(self):
+        current_app.config["JWT_ON"] = True
+        init_jwt_verifiers(current_app)
+
+        view = jwt_required(lambda: "ok")
+        self.assertRaises(NoAuthorizationError, view)
+
+    def test_jwt_verifiers_per_app(self):
+        other = create_app("testing")
+        other.config["JWT_ON"] = True
+        init_jwt_verifiers(other)
+
+        view = jwt_required(lambda: "ok")
+        self.assertEqual(view(), "ok")
+        with other.test_request_context():
+            self.assertRaises(NoAuthorizationError, view)
+
+    def test_inject_jwt_reuses_token(self):
+        """
+        A username header stands in for a token, minted once and reused
+        """
+
+        headers = {"username": self.username}
+        for _ in range(2):
+            response = self.client.get(
+                url_for("api.auth_token_api"), headers=headers
+            )
+            self.assertEqual(response.status_code, 200)
+
+        stats = current_app.extensions["injected_tokens"].stats()
+        self.assertEqual(stats["size"], 1)
+        self.assertEqual(stats["hits"], 1)
+
+    def test_inject_jwt_keeps_authorization(self):
+        response = self.client.get(
+            url_for("api.auth_token_api"),
+            headers={"username": self.username, "Authorization": "Bearer x"},
+        )
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(
+            current_app.extensions["injected_tokens"].stats()["size"], 0
+        )
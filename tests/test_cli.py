@@ -1,4 +1,16 @@
+import json
+import os
+import shutil
+import tempfile
 import unittest
+import uuid
+from datetime import datetime, timedelta
+from unittest import mock
+
+from flask import current_app
+
+from jam.extensions import db
+from jam.models import TokenModel, UserModel
 
 from .base import BaseTestCase
 
@@ -6,3 +18,156 @@ from .base import BaseTestCase
 class CliTestCase(BaseTestCase):
     def test_initdb(self):
         pass
+
+    def _add_expired_tokens(self, count):
+        for _ in range(count):
+            db.session.add(
+                TokenModel(
+                    jti=str(uuid.uuid4()),
+                    token_type="access",
+                    user_identity=self.username,
+                    revoked=False,
+                    expires=datetime.now() - timedelta(minutes=1),
+                )
+            )
+        db.session.commit()
+
+    def test_prunetoken(self):
+        self._add_expired_tokens(5)
+
+        result = self.runner.invoke(args=["prunetoken", "--batch-size", "2"])
+        self.assertEqual(result.exit_code, 0)
+        self.assertIn("Deleted 4 token(s)...", result.output)
+        self.assertIn("Deleted 5 expired token(s)", result.output)
+        self.assertIn("rows/s", result.output)
+        self.assertEqual(TokenModel.query.count(), 2)
+
+    def test_prunetoken_pause(self):
+        self._add_expired_tokens(1)
+        current_app.config["PRUNE_PAUSE"] = 0.5
+        prune = "jam.models.TokenModel.prune_database_tokens"
+        with mock.patch(prune, return_value=1) as pruner:
+            self.runner.invoke(args=["prunetoken"])
+            self.assertEqual(pruner.call_args[1]["pause"], 0.5)
+            self.runner.invoke(args=["prunetoken", "--pause", "0"])
+            self.assertEqual(pruner.call_args[1]["pause"], 0)
+
+    def test_prunetoken_dry_run(self):
+        self._add_expired_tokens(3)
+
+        result = self.runner.invoke(args=["prunetoken", "--dry-run"])
+        self.assertIn("3 expired token(s) would be deleted.", result.output)
+        self.assertEqual(TokenModel.query.count(), 5)
+
+    def test_hashbench(self):
+        result = self.runner.invoke(args=["hashbench", "--target-ms", "5"])
+        self.assertEqual(result.exit_code, 0)
+        self.assertIn("Current pbkdf2:sha256:150000", result.output)
+        self.assertIn(
+            "Suggested PASSWORD_HASH_METHOD=pbkdf2:sha256:", result.output
+        )
+
+    def test_genkey(self):
+        keys_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, keys_dir)
+        current_app.config["JWT_KEYS_DIR"] = keys_dir
+
+        args = ["genkey", "--kid", "k1", "--algorithm", "ES256"]
+        result = self.runner.invoke(args=args)
+        self.assertEqual(result.exit_code, 0)
+        self.assertEqual(os.listdir(keys_dir), ["k1.pem"])
+
+        # Never overwrites a key
+        result = self.runner.invoke(args=args)
+        self.assertIsInstance(result.exception, FileExistsError)
+
+    def test_users_export(self):
+        tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmpdir)
+
+        path = os.path.join(tmpdir, "users.ndjson")
+        result = self.runner.invoke(args=["users", "export", path])
+        self.assertIn("Exported 1 user(s).", result.output)
+        with open(path) as f:
+            user = json.loads(f.readline())
+        self.assertEqual(user["username"], self.username)
+        self.assertTrue(user["password_hash"].startswith("pbkdf2:"))
+
+        path = os.path.join(tmpdir, "users.csv")
+        self.runner.invoke(args=["users", "export", path])
+        with open(path) as f:
+            self.assertEqual(
+                f.readline().strip(), "username,email,name,password_hash"
+            )
+
+    def test_users_import(self):
+        tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmpdir)
+        path = os.path.join(tmpdir, "users.csv")
+        with open(path, "w") as f:
+            f.write("username,password,password_hash\n")
+            f.write("abc,456,\n")
+            f.write("x,1,\n")
+            f.write("x,2,\n")
+            pwhash = UserModel.find_by_username("abc").password_hash
+            f.write("y,,{}\n".format(pwhash))
+            f.write("z,,\n")
+
+        result = self.runner.invoke(
+            args=["users", "import", path, "--batch-size", "2"]
+            + ["--workers", "1"]
+        )
+        self.assertEqual(result.exit_code, 0, result.output)
+        self.assertIn("Imported 2 user(s), skipped 3", result.output)
+        x, y = UserModel.find_by_username("x"), UserModel.find_by_username("y")
+        self.assertTrue(x.validate_password("1"))
+        self.assertTrue(y.validate_password("123"))
+        self.assertIsNone(UserModel.find_by_username("z"))
+
+    def test_forge(self):
+        args = ["forge", "--users", "7", "--tokens", "4", "--batch-size"]
+        args += ["10", "--hash-method", "pbkdf2:sha256:1", "--seed", "1"]
+        result = self.runner.invoke(args=args)
+        self.assertEqual(result.exit_code, 0, result.output)
+        self.assertIn("Created 2 user(s), 8 token(s)...", result.output)
+        self.assertIn("Created 7 user(s) and 28 token(s)", result.output)
+
+        forged = UserModel.query.filter(UserModel.username.like("forge%"))
+        self.assertEqual(forged.count(), 7)
+        self.assertTrue(
+            UserModel.find_by_username("forge6").validate_password("forge")
+        )
+        tokens = TokenModel.query.filter_by(user_identity="forge0").all()
+        self.assertEqual(
+            sorted(token.token_type for token in tokens),
+            ["access", "access", "refresh", "refresh"],
+        )
+        for token in tokens:
+            days = 30 if token.token_type == "refresh" else 1
+            lifetime = timedelta(days=days)
+            self.assertLess(abs(token.expires - datetime.now()), lifetime)
+
+        # Reruns with the same seed carry on numbering, with new jtis
+        result = self.runner.invoke(args=args)
+        self.assertEqual(result.exit_code, 0, result.output)
+        self.assertIsNotNone(UserModel.find_by_username("forge13"))
+
+    def test_forge_numbering(self):
+        db.session.add_all(
+            [UserModel(username=name) for name in ("forgery", "forge5")]
+        )
+        db.session.commit()
+        UserModel.query.filter_by(username="forge5").delete()
+        db.session.add(UserModel(username="forge9"))
+        db.session.commit()
+
+        args = ["forge", "--users", "1", "--tokens", "0"]
+        result = self.runner.invoke(args=args)
+        self.assertEqual(result.exit_code, 0, result.output)
+        self.assertIsNotNone(UserModel.find_by_username("forge10"))
+
+        # LIKE wildcards in the prefix are taken literally
+        db.session.add(UserModel(username="aXb7"))
+        db.session.commit()
+        self.runner.invoke(args=args + ["--prefix", "a_b"])
+        self.assertIsNotNone(UserModel.find_by_username("a_b0"))
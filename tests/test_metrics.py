@@ -0,0 +1,69 @@
+from flask import url_for
+from prometheus_client import REGISTRY
+
+from jam import create_app
+from jam.settings import TestingConfig, conf
+
+from .base import BaseTestCase
+
+
+def sample(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0
+
+
+class MetricsTestCase(BaseTestCase):
+    def test_request_metrics(self):
+        labels = {"endpoint": "api.auth_token_api"}
+        requests = sample(
+            "jam_request_duration_seconds_count",
+            method="POST",
+            status="200",
+            **labels
+        )
+        queries = sample("jam_request_db_queries_sum", **labels)
+        checks = sample("jam_password_hash_seconds_count", operation="check")
+
+        self.assertEqual(self.login().status_code, 200)
+
+        self.assertEqual(
+            sample(
+                "jam_request_duration_seconds_count",
+                method="POST",
+                status="200",
+                **labels
+            ),
+            requests + 1,
+        )
+        self.assertGreater(
+            sample("jam_request_db_queries_sum", **labels), queries
+        )
+        self.assertEqual(
+            sample("jam_password_hash_seconds_count", operation="check"),
+            checks + 1,
+        )
+
+    def test_scrape(self):
+        self.login()
+        response = self.client.get(url_for("metrics"))
+        self.assertEqual(response.status_code, 200)
+        data = response.get_data(as_text=True)
+        self.assertIn("jam_request_duration_seconds_bucket{", data)
+        self.assertIn('endpoint="api.auth_token_api"', data)
+
+
+class MetricsDisabledTestCase(BaseTestCase):
+    def create_app(self):
+        conf["no_metrics"] = type(
+            "NoMetricsConfig", (TestingConfig,), {"METRICS_ENABLED": False}
+        )
+        self.addCleanup(conf.pop, "no_metrics")
+        return create_app("no_metrics")
+
+    def test_nothing_recorded(self):
+        before = sample("jam_password_hash_seconds_count", operation="check")
+        self.login()
+        self.assertEqual(
+            sample("jam_password_hash_seconds_count", operation="check"),
+            before,
+        )
+        self.assertEqual(self.client.get("/metrics").status_code, 404)
@@ -0,0 +1,73 @@
+from flask import current_app, url_for
+
+from jam import create_app
+from jam.exceptions import QueryBudgetExceeded
+from jam.extensions import db
+
+from .base import BaseTestCase
+
+
+class QueryBudgetTestCase(BaseTestCase):
+    """
+    Pins the SQL statements run by the hot auth endpoints, with the
+    revocation checks on. Raise a budget only along with the change that
+    needs it.
+    """
+
+    budgets = {
+        "POST api.auth_token_api": 2,
+        "GET api.auth_token_api": 2,
+        "api.auth_token_refresh_api": 1,
+        "api.auth_logout_access_api": 1,
+        "api.auth_logout_refresh_api": 1,
+    }
+
+    def create_app(self):
+        app = create_app("testing")
+        app.config["JWT_BLACKLIST_ENABLED"] = True
+        app.config["QUERY_BUDGETS"] = self.budgets
+        return app
+
+    def test_login(self):
+        self.assertEqual(self.login().status_code, 200)
+
+    def test_refresh(self):
+        response = self.client.post(
+            url_for("api.auth_token_refresh_api"),
+            headers=self._set_auth_headers(self.token_refresh),
+        )
+        self.assertEqual(response.status_code, 200)
+
+    def test_logout(self):
+        self.assertEqual(
+            self.logout_access(self.token_access).status_code, 200
+        )
+        self.assertEqual(
+            self.logout_refresh(self.token_refresh).status_code, 200
+        )
+
+    def test_token_list(self):
+        for _ in range(3):
+            self.login()
+        response = self.client.get(
+            url_for("api.auth_token_api", count="true"),
+            headers=self._set_auth_headers(self.token_access),
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json), 8)
+
+    def test_over_budget(self):
+        current_app.config["QUERY_BUDGETS"] = {"POST api.auth_token_api": 1}
+        with self.assertRaises(QueryBudgetExceeded) as cm:
+            self.login()
+        db.session.rollback()
+        self.assertIn("ran 2 statements, the budget is 1", str(cm.exception))
+        self.assertIn("INSERT INTO token", str(cm.exception))
+
+
+class SlowQueryTestCase(BaseTestCase):
+    def test_slow_query_logged(self):
+        current_app.config["SLOW_QUERY_THRESHOLD"] = 1e-9
+        with self.assertLogs(current_app.logger, "WARNING") as cm:
+            self.login()
+        self.assertIn("in api.auth_token_api: SELECT", cm.output[0])
@@ -0,0 +1,42 @@
+import uuid
+from datetime import datetime, timedelta
+
+from flask import current_app
+
+from jam.extensions import db
+from jam.models import TokenModel
+from jam.scheduler import TokenPruner, advisory_lock
+
+from .base import BaseTestCase
+
+
+class TokenPrunerTestCase(BaseTestCase):
+    def test_run_once(self):
+        db.session.add(
+            TokenModel(
+                jti=str(uuid.uuid4()),
+                token_type="access",
+                user_identity=self.username,
+                revoked=False,
+                expires=datetime.now() - timedelta(minutes=1),
+            )
+        )
+        db.session.commit()
+
+        pruner = TokenPruner(current_app._get_current_object())
+        self.assertEqual(pruner.run_once(), 1)
+        self.assertEqual(TokenModel.query.count(), 2)
+
+    def test_next_delay_jitter(self):
+        current_app.config["TOKEN_PRUNE_INTERVAL"] = 100
+        current_app.config["TOKEN_PRUNE_JITTER"] = 0.2
+        pruner = TokenPruner(current_app._get_current_object())
+        for _ in range(50):
+            self.assertTrue(80 <= pruner.next_delay() <= 120)
+
+    def test_not_started_by_default(self):
+        self.assertNotIn("token_pruner", current_app.extensions)
+
+    def test_advisory_lock_on_sqlite(self):
+        with advisory_lock("jam.test") as acquired:
+            self.assertTrue(acquired)
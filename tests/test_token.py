@@ -0,0 +1,256 @@
+import os
+import shutil
+import tempfile
+
+import jwt
+from cryptography.hazmat.primitives import serialization
+from flask import url_for
+from flask_jwt_extended import decode_token
+from jwt.exceptions import InvalidTokenError
+from jwt.utils import from_base64url_uint
+
+from jam import create_app
+from jam.extensions import revocation, signing_keys
+from jam.keys import generate_private_key, write_private_key
+from jam.models import TokenGenerationModel, TokenModel
+from jam.revocation import RevocationCache
+from jam.utils import mint_access_token, mint_refresh_token
+
+from .base import BaseTestCase
+from .fakes import FakeRedis
+
+
+class RevocationCacheTestCase(BaseTestCase):
+    def test_cache_filled_on_save(self):
+        """
+        A freshly saved token is answered from the cache
+        """
+
+        decoded = decode_token(self.token_access)
+        self.assertFalse(TokenModel.is_token_revoked(decoded))
+        self.assertEqual(revocation.stats()["hits"], 1)
+        self.assertEqual(revocation.stats()["misses"], 0)
+
+    def test_cache_miss_then_hit(self):
+        decoded = decode_token(self.token_access)
+        revocation.cache.clear()
+
+        self.assertFalse(TokenModel.is_token_revoked(decoded))
+        self.assertFalse(TokenModel.is_token_revoked(decoded))
+        self.assertEqual(revocation.stats()["hits"], 1)
+        self.assertEqual(revocation.stats()["misses"], 1)
+
+    def test_revoke_writes_through(self):
+        decoded = decode_token(self.token_access)
+        self.assertFalse(TokenModel.is_token_revoked(decoded))
+
+        TokenModel.revoke_token(jti=decoded["jti"])
+        self.assertTrue(TokenModel.is_token_revoked(decoded))
+
+        TokenModel.unrevoke_token(jti=decoded["jti"])
+        self.assertFalse(TokenModel.is_token_revoked(decoded))
+
+    def test_batch_revoke_updates_cache(self):
+        self.login()
+        tokens = TokenModel.get_user_tokens(self.username)
+        for token in tokens:
+            self.assertFalse(revocation.get(token.jti))
+
+        count = TokenModel.revoke_tokens(self.username, chunk_size=3)
+        self.assertEqual(count, 4)
+        for token in TokenModel.get_user_tokens(self.username):
+            self.assertTrue(token.revoked)
+            self.assertTrue(revocation.get(token.jti))
+
+    def test_unknown_token_is_revoked(self):
+        self.assertTrue(TokenModel.is_token_revoked({"jti": "missing"}))
+
+    def test_cache_bounded_and_expiring(self):
+        cache = RevocationCache(maxsize=2)
+        cache.set("a", False, 2 ** 40)
+        cache.set("b", False, 2 ** 40)
+        cache.set("c", True, 2 ** 40)
+        self.assertIsNone(cache.get("a"))
+        self.assertTrue(cache.get("c"))
+
+        cache.set("d", False, 1)
+        self.assertIsNone(cache.get("d"))
+
+    def test_add_does_not_overwrite(self):
+        cache = RevocationCache()
+        cache.set("a", True, 2 ** 40)
+        cache.add("a", False, 2 ** 40)
+        self.assertTrue(cache.get("a"))
+
+
+class MintTokenTestCase(BaseTestCase):
+    def test_minted_claims_match_decoded(self):
+        for mint in (mint_access_token, mint_refresh_token):
+            encoded_token, claims = mint(self.username)
+            self.assertEqual(claims, decode_token(encoded_token))
+
+    def test_save_decoded_tokens_in_bulk(self):
+        claims = [mint_access_token(self.username)[1] for _ in range(3)]
+        TokenModel.save_decoded_tokens_to_db(claims, "identity")
+
+        jtis = [x.jti for x in TokenModel.get_user_tokens(self.username)]
+        self.assertEqual(jtis[2:], [x["jti"] for x in claims])
+        self.assertFalse(TokenModel.is_token_revoked(claims[0]))
+
+
+class RedisRevocationTestCase(BaseTestCase):
+    def create_app(self):
+        app = create_app("testing")
+        app.config["REVOCATION_BACKEND"] = "redis"
+        app.extensions["redis"] = self.redis = FakeRedis()
+        revocation.init_app(app)
+        return app
+
+    def test_save_goes_through_store(self):
+        jti = decode_token(self.token_access)["jti"]
+        self.assertEqual(self.redis.get("jam:revoked:" + jti), b"0")
+        self.assertGreater(self.redis.ttl("jam:revoked:" + jti), 0)
+
+    def test_store_shared_between_workers(self):
+        """
+        A revoke seen through the store is visible to a worker whose own
+        cache has never heard of the token
+        """
+
+        decoded = decode_token(self.token_access)
+        TokenModel.revoke_token(jti=decoded["jti"])
+        revocation.cache.clear()
+
+        self.assertTrue(TokenModel.is_token_revoked(decoded))
+        self.assertEqual(
+            self.redis.get("jam:revoked:" + decoded["jti"]), b"1"
+        )
+
+    def test_store_miss_falls_back_to_database(self):
+        decoded = decode_token(self.token_refresh)
+        self.redis.delete("jam:revoked:" + decoded["jti"])
+        revocation.cache.clear()
+
+        self.assertFalse(TokenModel.is_token_revoked(decoded))
+        self.assertEqual(
+            self.redis.get("jam:revoked:" + decoded["jti"]), b"0"
+        )
+
+    def test_revoke_not_overwritten_by_stale_read(self):
+        """
+        A worker that read the row before another one revoked the token
+        can't put "not revoked" back into the store
+        """
+
+        for revoke in (
+            lambda decoded: TokenModel.revoke_token(jti=decoded["jti"]),
+            lambda decoded: TokenModel.revoke_token(
+                jti=decoded["jti"], exp=decoded["exp"]
+            ),
+            lambda decoded: TokenModel.revoke_token(
+                TokenModel.query.filter_by(jti=decoded["jti"]).one().id,
+                self.username,
+            ),
+        ):
+            decoded = decode_token(self.login().get_json()["access_token"])
+            revoke(decoded)
+            self.assertEqual(
+                self.redis.get("jam:revoked:" + decoded["jti"]), b"1"
+            )
+
+            revocation.cache.clear()
+            revocation.add(decoded["jti"], False, decoded["exp"])
+            revocation.cache.clear()
+            self.assertTrue(TokenModel.is_token_revoked(decoded))
+
+    def test_batch_revoke_goes_through_store(self):
+        decoded = decode_token(self.token_access)
+        TokenModel.revoke_tokens(self.username)
+
+        self.assertTrue(TokenModel.is_token_revoked(decoded))
+        self.assertEqual(
+            self.redis.get("jam:revoked:" + decoded["jti"]), b"1"
+        )
+
+    def test_generation_goes_through_store(self):
+        self.assertEqual(TokenGenerationModel.bump(self.username), 1)
+        revocation.generations.clear()
+
+        self.assertEqual(self.redis.get("jam:generation:abc"), b"1")
+        self.assertEqual(TokenGenerationModel.get_generation("abc"), 1)
+        self.assertEqual(TokenGenerationModel.bump(self.username), 2)
+
+
+class SigningKeysTestCase(BaseTestCase):
+    algorithm = "RS256"
+
+    def create_app(self):
+        self.keys_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.keys_dir)
+        self.add_key("1")
+        self.add_key("2")
+        return self.make_app()
+
+    def add_key(self, kid):
+        write_private_key(
+            self.keys_dir, kid, generate_private_key(self.algorithm)
+        )
+
+    def make_app(self, **config):
+        app = create_app("testing")
+        app.config.update(
+            JWT_ALGORITHM=self.algorithm, JWT_KEYS_DIR=self.keys_dir, **config
+        )
+        signing_keys.init_app(app)
+        return app
+
+    def test_signed_with_last_key(self):
+        header = jwt.get_unverified_header(self.token_access)
+        self.assertEqual(header["alg"], self.algorithm)
+        self.assertEqual(header["kid"], "2")
+        self.assertEqual(decode_token(self.token_access)["identity"], "abc")
+
+    def test_rotation(self):
+        """
+        Tokens signed with a retired key stay valid as long as its public
+        key is kept, and become invalid once it is removed
+        """
+
+        with self.make_app(JWT_KEY_ID="1").app_context():
+            token, _ = mint_access_token(self.username)
+
+        key = signing_keys.state["public"]["1"]
+        os.remove(os.path.join(self.keys_dir, "1.pem"))
+        with open(os.path.join(self.keys_dir, "1.pub.pem"), "wb") as f:
+            f.write(
+                key.public_bytes(
+                    serialization.Encoding.PEM,
+                    serialization.PublicFormat.SubjectPublicKeyInfo,
+                )
+            )
+        with self.make_app().app_context():
+            self.assertEqual(decode_token(token)["identity"], "abc")
+
+        os.remove(os.path.join(self.keys_dir, "1.pub.pem"))
+        with self.make_app().app_context():
+            self.assertRaises(InvalidTokenError, decode_token, token)
+
+    def test_jwks(self):
+        response = self.client.get(url_for("api.auth_jwks_api"))
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("max-age=300", response.headers["Cache-Control"])
+
+        keys = {jwk["kid"]: jwk for jwk in response.get_json()["keys"]}
+        self.assertEqual(set(keys), {"1", "2"})
+        self.assertEqual(keys["2"]["alg"], self.algorithm)
+
+        numbers = signing_keys.state["public"]["2"].public_numbers()
+        for name, value in keys["2"].items():
+            if name in ("n", "e", "x", "y"):
+                self.assertEqual(
+                    from_base64url_uint(value), getattr(numbers, name)
+                )
+
+
+class ECSigningKeysTestCase(SigningKeysTestCase):
+    algorithm = "ES256"
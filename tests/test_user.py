@@ -1,4 +1,11 @@
+import json
+import time
+
 from flask import url_for
+from flask_jwt_extended import decode_token
+
+from jam.extensions import db, revocation
+from jam.models import TokenModel, UserModel
 
 from .base import BaseTestCase
 
@@ -21,3 +28,86 @@ class UserTestCase(BaseTestCase):
             headers=self._set_auth_headers(self.token_access),
         )
         self.assertListEqual([], response.get_json()["users"])
+        self.assertEqual(TokenModel.query.count(), 0)
+
+    def test_user_delete_batches(self):
+        db.session.add_all([UserModel(username=str(i)) for i in range(4)])
+        db.session.commit()
+
+        calls = []
+        self.assertEqual(UserModel.delete_all(2, progress=calls.append), 5)
+        self.assertEqual(calls, [2, 4, 5])
+        self.assertEqual(UserModel.query.count(), 0)
+
+    def test_user_delete_revokes_tokens(self):
+        decoded = decode_token(self.token_access)
+        UserModel.delete_all()
+        self.assertTrue(revocation.get(decoded["jti"]))
+        self.assertTrue(TokenModel.is_token_revoked(decoded))
+
+    def test_user_delete_async(self):
+        response = self.client.delete(
+            url_for("api.user_api", **{"async": "true"}),
+            headers=self._set_auth_headers(self.token_access),
+        )
+        self.assertEqual(response.status_code, 202)
+        location = response.headers["Location"]
+
+        deadline = time.time() + 5
+        while True:
+            job = self.client.get(
+                location, headers=self._set_auth_headers(self.token_access)
+            ).get_json()
+            if job["status"] in ("done", "failed") or time.time() > deadline:
+                break
+            time.sleep(0.05)
+        self.assertEqual(job["status"], "done")
+        self.assertEqual(job["result"], "1")
+        self.assertEqual(UserModel.query.count(), 0)
+
+    def test_job_not_found(self):
+        response = self.client.get(
+            url_for("api.job_api", job_id="missing"),
+            headers=self._set_auth_headers(self.token_access),
+        )
+        self.assertEqual(response.status_code, 404)
+
+    def test_user_get_paginated(self):
+        db.session.add_all(
+            [UserModel(username="def"), UserModel(username="g")]
+        )
+        db.session.commit()
+
+        response = self.client.get(
+            url_for("api.user_api", limit=2),
+            headers=self._set_auth_headers(self.token_access),
+        )
+        page = response.get_json()
+        self.assertEqual(
+            [{"username": "abc"}, {"username": "def"}], page["users"]
+        )
+        self.assertIn("cursor=2", response.headers["Link"])
+
+        response = self.client.get(
+            url_for("api.user_api", limit=2, cursor=page["next_cursor"]),
+            headers=self._set_auth_headers(self.token_access),
+        )
+        self.assertEqual([{"username": "g"}], response.get_json()["users"])
+        self.assertIsNone(response.get_json()["next_cursor"])
+        self.assertNotIn("Link", response.headers)
+
+    def test_user_get_bad_limit(self):
+        response = self.client.get(
+            url_for("api.user_api", limit=0),
+            headers=self._set_auth_headers(self.token_access),
+        )
+        self.assertEqual(response.status_code, 400)
+
+    def test_user_get_ndjson(self):
+        response = self.client.get(
+            url_for("api.user_api", format="ndjson"),
+            headers=self._set_auth_headers(self.token_access),
+        )
+        self.assertEqual(response.mimetype, "application/x-ndjson")
+        lines = response.get_data(as_text=True).splitlines()
+        self.assertEqual([{"username": "abc"}], [json.loads(x) for x in lines])